@@ -18,12 +18,12 @@ void sendOutput()
     serialOutputSendIndex = (serialOutputSendIndex + 1) % sizeof(serialOutputBuffer);
 }
 
-/* chars */
-void serialWrite(const char *output)
+/* raw bytes, may contain zeros */
+void serialWriteBytes(const char *output, int length)
 {
-    while (*output)
+    for (int i = 0; i < length; i++)
     {
-        serialOutputBuffer[serialOutputWriteIndex] = *output++;
+        serialOutputBuffer[serialOutputWriteIndex] = output[i];
         serialOutputWriteIndex = (serialOutputWriteIndex + 1) % sizeof(serialOutputBuffer);
 
         if (serialOutputWriteIndex == serialOutputSendIndex)
@@ -33,6 +33,12 @@ void serialWrite(const char *output)
     }
 }
 
+/* chars */
+void serialWrite(const char *output)
+{
+    serialWriteBytes(output, strlen(output));
+}
+
 void serialWriteln(const char *output)
 {
     serialWrite(output);
@@ -9,6 +9,9 @@ extern int serialOutputWriteIndex;
 extern int serialOutputSendIndex;
 extern char serialOutputBuffer[500];
 
+// Function declaration for raw bytes
+void serialWriteBytes(const char *output, int length);
+
 // Function declarations for char*
 void serialWriteln(const char *output);
 void serialWrite(const char *output);
@@ -205,6 +205,12 @@ int nextPositionToPlace = 1;
 int nextPositionToGo = 0;
 position futurePositions[futurePositionsLength];
 
+// slots of futurePositions that can still be filled
+int freePositionSlots()
+{
+  return (nextPositionToGo - nextPositionToPlace + futurePositionsLength) % futurePositionsLength;
+}
+
 int stepsSinceCorrection = 0;
 const int stepsUntilCorrection = 50;
 bool angleTargetReached = false;
@@ -341,37 +347,94 @@ bool draw()
   return false;
 }
 
+// the status is sent as a binary frame after a "STATUS FRAME" line:
+// version (1 byte), payload length (1 byte), payload, checksum (2 bytes).
+// the payload is little endian and packed, for version 1:
+//   mode (1 byte), flags (1 byte, see below),
+//   amplitude position, target position and speed (int32 each),
+//   angle position, target position and speed (int32 each),
+//   travelable distance steps (int32), steps per mm (float32),
+//   min amplitude, max amplitude and max angle positions (int32 each),
+//   encoder count (int64), max encoder count (int32),
+//   next position to place and to go (int32 each)
+// the checksum is the sum of all bytes before it, cut to 16 bits.
+// fields are never moved or resized without bumping the version
+const uint8_t statusFrameVersion = 1;
+const int statusPayloadSize = 66;
+
+// bits of the flags byte
+const uint8_t statusCalibrated = 1 << 0;
+const uint8_t statusCalibrating = 1 << 1;
+const uint8_t statusAngleCorrectionEnabled = 1 << 2;
+const uint8_t statusMinAmplitudeButton = 1 << 3;
+const uint8_t statusMaxAmplitudeButton = 1 << 4;
+const uint8_t statusMinAngleButton = 1 << 5;
+const uint8_t statusMaxAngleButton = 1 << 6;
+
+int int32ToBuffer(char *buffer, int position, int32_t value)
+{
+  memcpy(buffer + position, &value, sizeof(value));
+  return position + sizeof(value);
+}
+
+int int64ToBuffer(char *buffer, int position, int64_t value)
+{
+  memcpy(buffer + position, &value, sizeof(value));
+  return position + sizeof(value);
+}
+
+int floatToBuffer(char *buffer, int position, float value)
+{
+  memcpy(buffer + position, &value, sizeof(value));
+  return position + sizeof(value);
+}
+
 void printStatus()
 {
-  serialWriteln("STATUS START");
-  serialWriteln(currentMode);
-  serialWriteln(calibrated);
-  serialWriteln(calibrating);
-
-  serialWriteln(amplitudeStepper->getPosition());
-  serialWriteln(amplitudeStepper->getTargetPosition());
-  serialWriteln(amplitudeStepper->getCurrentSpeed());
-
-  serialWriteln(angleStepper->getPosition());
-  serialWriteln(angleStepper->getTargetPosition());
-  serialWriteln(angleStepper->getCurrentSpeed());
-
-  serialWriteln(travelableDistanceSteps);
-  serialWriteln(stepsPerMm);
-  serialWriteln(minAmplitudePos);
-  serialWriteln(maxAmplituePos);
-  serialWriteln(maxAnglePos);
-  serialWriteln(angleEncoder.getCount());
-  serialWriteln(maxEncoderCount);
-  serialWriteln(nextPositionToPlace);
-  serialWriteln(nextPositionToGo);
-
-  serialWriteln(digitalRead(zeroAmplitudePin));
-  serialWriteln(digitalRead(maxAmplitudePin));
-  serialWriteln(digitalRead(zeroAnglePin));
-  serialWriteln(digitalRead(maxAnglePin));
-
-  serialWriteln(angleCorrectionEnabled);
+  char frame[2 + statusPayloadSize + 2];
+  int writeIdx = 0;
+  frame[writeIdx++] = statusFrameVersion;
+  frame[writeIdx++] = statusPayloadSize;
+
+  uint8_t flags = 0;
+  flags |= calibrated ? statusCalibrated : 0;
+  flags |= calibrating ? statusCalibrating : 0;
+  flags |= angleCorrectionEnabled ? statusAngleCorrectionEnabled : 0;
+  flags |= digitalRead(zeroAmplitudePin) ? statusMinAmplitudeButton : 0;
+  flags |= digitalRead(maxAmplitudePin) ? statusMaxAmplitudeButton : 0;
+  flags |= digitalRead(zeroAnglePin) ? statusMinAngleButton : 0;
+  flags |= digitalRead(maxAnglePin) ? statusMaxAngleButton : 0;
+  frame[writeIdx++] = currentMode;
+  frame[writeIdx++] = flags;
+
+  writeIdx = int32ToBuffer(frame, writeIdx, amplitudeStepper->getPosition());
+  writeIdx = int32ToBuffer(frame, writeIdx, amplitudeStepper->getTargetPosition());
+  writeIdx = int32ToBuffer(frame, writeIdx, amplitudeStepper->getCurrentSpeed());
+
+  writeIdx = int32ToBuffer(frame, writeIdx, angleStepper->getPosition());
+  writeIdx = int32ToBuffer(frame, writeIdx, angleStepper->getTargetPosition());
+  writeIdx = int32ToBuffer(frame, writeIdx, angleStepper->getCurrentSpeed());
+
+  writeIdx = int32ToBuffer(frame, writeIdx, travelableDistanceSteps);
+  writeIdx = floatToBuffer(frame, writeIdx, stepsPerMm);
+  writeIdx = int32ToBuffer(frame, writeIdx, minAmplitudePos);
+  writeIdx = int32ToBuffer(frame, writeIdx, maxAmplituePos);
+  writeIdx = int32ToBuffer(frame, writeIdx, maxAnglePos);
+  writeIdx = int64ToBuffer(frame, writeIdx, angleEncoder.getCount());
+  writeIdx = int32ToBuffer(frame, writeIdx, maxEncoderCount);
+  writeIdx = int32ToBuffer(frame, writeIdx, nextPositionToPlace);
+  writeIdx = int32ToBuffer(frame, writeIdx, nextPositionToGo);
+
+  uint16_t checksum = 0;
+  for (int i = 0; i < writeIdx; i++)
+  {
+    checksum += (uint8_t)frame[i];
+  }
+  frame[writeIdx++] = checksum & 0xff;
+  frame[writeIdx++] = checksum >> 8;
+
+  serialWriteln("STATUS FRAME");
+  serialWriteBytes(frame, writeIdx);
 }
 
 enum command
@@ -382,6 +445,9 @@ enum command
   calibrate,
   addPosition,
   setAngleCorrection,
+  addPositions,
+  resetSequence,
+  ping,
 };
 
 int readInt()
@@ -423,13 +489,73 @@ char commandEndChar = '>';
 
 int commandBufferIdx = 0;
 char currentCommand = 0;
-char commandBuffer[100];
+// positions (5 ints each) carried by a single addPositions command
+const int maxPositionsPerBatch = 32;
+// sequence number, command, position count, positions and checksum of the biggest command
+char commandBuffer[4 + 4 + 4 + maxPositionsPerBatch * 5 * 4 + 4 + 16];
+
+// commands start with a sequence number and are only processed in that order,
+// so a command that failed can be sent again without reordering the positions
+int expectedSequence = 0;
 
 int received_checksum = 0;
 int calculated_checksum = 0;
+
+position positionFromBuffer(const char *buffer, int readIdx)
+{
+  position p;
+  p.amplitudePosition = intFromBuffer(buffer, readIdx);
+  p.anglePosition = intFromBuffer(buffer, readIdx + 4);
+  p.penPosition = intFromBuffer(buffer, readIdx + 8);
+  p.amplitudeVelocity = intFromBuffer(buffer, readIdx + 12);
+  p.angleVelocity = intFromBuffer(buffer, readIdx + 16);
+  return p;
+}
+
+int positionChecksum(const position &p)
+{
+  return (p.amplitudePosition % 123) +
+         (p.anglePosition % 123) +
+         (p.penPosition % 123) +
+         (p.amplitudeVelocity % 123) +
+         (p.angleVelocity % 123);
+}
+
+// all positions of the batch are placed or none of them,
+// so a FAIL can always be answered by resending the same batch
+bool addPositionBatch(int readIdx)
+{
+  int nPositions = intFromBuffer(commandBuffer, readIdx);
+  readIdx += 4;
+  if (nPositions <= 0 || nPositions > maxPositionsPerBatch || freePositionSlots() < nPositions)
+  {
+    return false;
+  }
+
+  int batchChecksum = 0;
+  for (int i = 0; i < nPositions; i++)
+  {
+    batchChecksum += positionChecksum(positionFromBuffer(commandBuffer, readIdx + i * 20));
+  }
+
+  if (batchChecksum != intFromBuffer(commandBuffer, readIdx + nPositions * 20))
+  {
+    return false;
+  }
+
+  for (int i = 0; i < nPositions; i++)
+  {
+    futurePositions[nextPositionToPlace] = positionFromBuffer(commandBuffer, readIdx + i * 20);
+    nextPositionToPlace = (nextPositionToPlace + 1) % futurePositionsLength;
+  }
+
+  return true;
+}
+
 bool parseCommand()
 {
-  int readIdx = 0;
+  // skip the sequence number
+  int readIdx = 4;
   int cmd = intFromBuffer(commandBuffer, readIdx);
   readIdx += sizeof(cmd);
 
@@ -489,6 +615,11 @@ bool parseCommand()
     nextPositionToPlace = (nextPositionToPlace + 1) % futurePositionsLength;
     calculated_checksum = 0;
     break;
+  case addPositions:
+    return addPositionBatch(readIdx);
+  case ping:
+    // only there to get an answer with the free position slots
+    break;
   default:
     serialWriteln("DID NOT RECOGNIZE COMMAND TYPE");
   }
@@ -535,17 +666,23 @@ void readInput()
     }
     else
     {
-      if (commandDelimiterCounter > 0)
+      // serialWriteln("GOT COMMAND CHAR " + String(c));
+      // room for this byte and the end delimiters that turned out to be data
+      if (commandBufferIdx + commandDelimiterCounter + 1 > int(sizeof(commandBuffer)))
       {
-        // this means a previous byte was misinterpreted as an end delimiter
-        for (int i = 0; i < commandDelimiterCounter; i++)
-        {
-          commandBuffer[commandBufferIdx + i] = commandEndChar;
-          commandBufferIdx++;
-        }
+        // too long to be a command, drop it and wait for the next start
+        serialWriteln("COMMAND TOO LONG");
+        commandStarted = false;
+        commandBufferIdx = 0;
         commandDelimiterCounter = 0;
+        return;
+      }
+
+      // this means previous bytes were misinterpreted as end delimiters
+      for (; commandDelimiterCounter > 0; commandDelimiterCounter--)
+      {
+        commandBuffer[commandBufferIdx++] = commandEndChar;
       }
-      // serialWriteln("GOT COMMAND CHAR " + String(c));
       commandBuffer[commandBufferIdx] = c;
       commandBufferIdx++;
     }
@@ -553,14 +690,30 @@ void readInput()
   else if (commandComplete)
   {
     // serialWriteln("PROCESSING CMD");
-    if (parseCommand())
+    int sequence = intFromBuffer(commandBuffer, 0);
+    bool processed = false;
+    if (intFromBuffer(commandBuffer, 4) == resetSequence)
     {
-      serialWriteln("OK");
+      expectedSequence = sequence + 1;
+      processed = true;
     }
-    else
+    else if (sequence - expectedSequence < 0)
     {
-      serialWriteln("FAIL");
+      // already processed, its ack got lost, acknowledge again without repeating it
+      processed = true;
     }
+    else if (sequence == expectedSequence && parseCommand())
+    {
+      expectedSequence++;
+      processed = true;
+    }
+
+    // commands after a missing or failed one fail too, the host sends them again in order.
+    // every answer carries the free position slots, the host only sends positions that fit
+    serialWrite(processed ? "OK " : "FAIL ");
+    serialWrite(sequence);
+    serialWrite(" ");
+    serialWriteln(freePositionSlots());
     commandStarted = false;
     commandComplete = false;
     commandBufferIdx = 0;
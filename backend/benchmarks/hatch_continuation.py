@@ -0,0 +1,53 @@
+"""
+times zigzag and rect line hatching of a dense grid of shapes, where every
+scanline crosses many paths and carries many paths in construction,
+run from the backend directory with:
+    python -m benchmarks.hatch_continuation
+"""
+import time
+
+from svgpathtools import Path, Line
+
+from toolpath_generation.connecting_lines import zigzag_lines, rect_lines
+from toolpath_generation.util import IntersectionEngine, get_height_intersections_func
+
+CANVAS_SIZE = (500, 500)
+
+
+def _make_paths(n_columns: int):
+    # a grid of diamonds, every hatch line crosses each column twice
+    cell = CANVAS_SIZE[0] / n_columns
+    paths = []
+    for column in range(n_columns):
+        for row in range(4):
+            center = complex((column + .5) * cell, (row + .5) * CANVAS_SIZE[1] / 4)
+            corners = [center - cell * .4, center - 50j, center + cell * .4, center + 50j]
+            paths.append(Path(*[Line(start, end) for start, end in zip(corners, corners[1:] + corners[:1])]))
+    return paths
+
+
+def bench(toolpath_func, paths, line_step=1):
+    start = time.perf_counter()
+    height_intersections = get_height_intersections_func(IntersectionEngine.SCANLINE)(
+        paths, CANVAS_SIZE, line_step, 0)
+    n_intersections = sum(len(intersections) for _, intersections in height_intersections)
+    intersection_duration = time.perf_counter() - start
+
+    start = time.perf_counter()
+    n_lines = sum(1 for _ in toolpath_func(paths, CANVAS_SIZE, line_step=line_step))
+    # what is left once the intersections are taken out is the line connecting
+    return time.perf_counter() - start - intersection_duration, n_intersections, n_lines
+
+
+def main():
+    for n_columns in (25, 50, 100, 200, 400):
+        paths = _make_paths(n_columns)
+        print("paths: %d" % len(paths))
+        for toolpath_func in (zigzag_lines, rect_lines):
+            duration, n_intersections, n_lines = bench(toolpath_func, paths)
+            print("  %-12s connecting %8.3fs  intersections %7d  %6.2f us per intersection  lines %d" %
+                  (toolpath_func.__name__, duration, n_intersections, duration / n_intersections * 1e6, n_lines))
+
+
+if __name__ == '__main__':
+    main()
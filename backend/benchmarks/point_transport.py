@@ -0,0 +1,61 @@
+"""
+compares the old per point Queue transport of the path generator
+with the chunked one, run from the backend directory with:
+    python -m benchmarks.point_transport
+"""
+import time
+from queue import Queue
+from threading import Thread
+
+import numpy as np
+
+from path_generator import _threaded_generation, PATH_END_COMMAND
+
+
+def _per_point_threaded_generation(target, queue_size=10000):
+    # the transport as it was before the chunked pipeline
+    queue = Queue(queue_size)
+    t = Thread(target=target, args=(queue,))
+    t.start()
+
+    while t.is_alive() or not queue.empty():
+        yield queue.get()
+
+
+def _make_batches(n_paths: int, points_per_path: int):
+    rng = np.random.default_rng(0)
+    return [rng.uniform(0, 500, (points_per_path, 2)) for _ in range(n_paths)]
+
+
+def bench_per_point(batches) -> float:
+    def _generate_points(queue: Queue):
+        for batch in batches:
+            for x, y in batch.tolist():
+                queue.put((x, y))
+            queue.put(PATH_END_COMMAND)
+
+    start = time.perf_counter()
+    n_points = sum(1 for item in _per_point_threaded_generation(_generate_points) if type(item) is tuple)
+    return n_points / (time.perf_counter() - start)
+
+
+def bench_chunked(batches) -> float:
+    def _generate_point_batches():
+        for batch in batches:
+            yield batch
+            yield PATH_END_COMMAND
+
+    start = time.perf_counter()
+    n_points = sum(1 for item in _threaded_generation(_generate_point_batches) if type(item) is tuple)
+    return n_points / (time.perf_counter() - start)
+
+
+def main():
+    batches = _make_batches(n_paths=2000, points_per_path=500)
+    print("points: %d" % sum(len(batch) for batch in batches))
+    print("per point queue: %.0f points/s" % bench_per_point(batches))
+    print("chunked queue:   %.0f points/s" % bench_chunked(batches))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+compares the old radar scan path sorting with the grid backed one,
+run from the backend directory with:
+    python -m benchmarks.radar_scan
+"""
+import time
+
+import numpy as np
+from svgpathtools import Path, Line
+
+from sort_paths import find_closest_path_with_radar_scan, sort_paths_with_radar_scan
+
+CANVAS_SIZE = (500, 500)
+
+
+def _make_paths(n_paths: int):
+    rng = np.random.default_rng(0)
+    paths = []
+    for x, y, width, height in zip(rng.uniform(0, CANVAS_SIZE[0], n_paths),
+                                   rng.uniform(0, CANVAS_SIZE[1], n_paths),
+                                   rng.uniform(5, 30, n_paths),
+                                   rng.uniform(5, 30, n_paths)):
+        start = complex(x, y)
+        paths.append(Path(Line(start, start + width), Line(start + width, start + complex(width, height))))
+    return paths
+
+
+def _travel(paths) -> float:
+    travel = 0
+    last_point = 0j
+    for path in paths:
+        travel += abs(path.point(0) - last_point)
+        last_point = path.point(1)
+    return travel
+
+
+def bench_old(paths):
+    # the old scan gives up (returns None) when it misses every remaining bbox
+    sorted_paths = []
+    last_point = 0j
+    start = time.perf_counter()
+    while len(paths) > 0:
+        path, paths = find_closest_path_with_radar_scan(last_point, paths, CANVAS_SIZE) or (None, paths)
+        if path is None:
+            break
+        sorted_paths.append(path)
+        last_point = path.point(1)
+
+    return sorted_paths, time.perf_counter() - start
+
+
+def bench_grid(paths):
+    start = time.perf_counter()
+    sorted_paths = list(sort_paths_with_radar_scan(0j, paths, CANVAS_SIZE))
+    return sorted_paths, time.perf_counter() - start
+
+
+def main():
+    for n_paths in (50, 100, 2000, 20000):
+        paths = _make_paths(n_paths)
+        print("paths: %d" % n_paths)
+        benches = [("grid radar scan", bench_grid)]
+        # the old scan takes minutes beyond a few hundred paths
+        if n_paths <= 100:
+            benches.insert(0, ("old radar scan", bench_old))
+        for name, bench in benches:
+            sorted_paths, duration = bench(paths)
+            print("  %-16s %8.3fs  sorted %d/%d  pen up travel %.0f" %
+                  (name, duration, len(sorted_paths), n_paths, _travel(sorted_paths)))
+
+
+if __name__ == '__main__':
+    main()
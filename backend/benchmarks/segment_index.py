@@ -0,0 +1,70 @@
+"""
+compares build time, memory and line query time of the QuadTree
+with the PackedSegmentIndex, run from the backend directory with:
+    python -m benchmarks.segment_index
+"""
+import time
+import tracemalloc
+
+import numpy as np
+from svgpathtools import Path, Line
+
+from path_quadtree import QuadTree, PackedSegmentIndex, Point, Rect
+
+CANVAS_SIZE = (500, 500)
+
+
+def _make_paths(n_paths: int, segments_per_path: int):
+    rng = np.random.default_rng(0)
+    paths = []
+    for _ in range(n_paths):
+        points = rng.uniform(0, 15, (segments_per_path + 1, 2)).cumsum(axis=0) + rng.uniform(0, 400, 2)
+        points = points[:, 0] + 1j * points[:, 1]
+        paths.append(Path(*[Line(start, end) for start, end in zip(points[:-1], points[1:])]))
+    return paths
+
+
+def _build(index_class, paths):
+    width, height = CANVAS_SIZE
+    index = index_class(Rect(Point(complex(-width * 2, -height * 2)), width * 4, height * 4), capacity=20)
+    for path in paths:
+        index.insert_path(path)
+    # the packed index is only built on the first query
+    index.get_all_unique_segments()
+    return index
+
+
+def bench(index_class, paths, line_step=5):
+    tracemalloc.start()
+    start = time.perf_counter()
+    index = _build(index_class, paths)
+    build_duration = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    width, height = CANVAS_SIZE
+    index.stats.reset()
+    start = time.perf_counter()
+    n_candidates = 0
+    for y in range(0, height, line_step):
+        # the area bbox_to_rect gives for a horizontal hatch line
+        area = Rect(Point(complex(-width - 5, y - 5)), width * 3 + 5, 5)
+        n_candidates += len(index.get_segments_in_area(area))
+    query_duration = time.perf_counter() - start
+
+    return build_duration, memory, query_duration, n_candidates, index.stats
+
+
+def main():
+    for n_paths in (100, 1000):
+        paths = _make_paths(n_paths, segments_per_path=10)
+        print("segments: %d" % (n_paths * 10))
+        for index_class in (QuadTree, PackedSegmentIndex):
+            build_duration, memory, query_duration, n_candidates, stats = bench(index_class, paths)
+            print("  %-18s build %7.3fs  memory %7.1f MB  line queries %7.3fs  unique candidates %d" %
+                  (index_class.__name__, build_duration, memory / 1e6, query_duration, n_candidates))
+            print("  %-18s %s" % ("", stats))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,5 @@
 import time
-from polar_sketcher_interface import PolarSketcherInterface, Mode
+from polar_sketcher_interface import PolarSketcherInterface, Mode, MAX_POSITIONS_PER_BATCH, MAX_STEPPER_VELOCITY
 from drawing_job.consumer_models import Consumer, ConsumerPoint
 from path_generator import CLOSE_PATH_COMMAND, PATH_END_COMMAND
 from typing import Tuple, Optional, Generator
@@ -10,8 +10,11 @@ class PolarSketcherConsumer(Consumer):
         self.polar_sketcher = polar_sketcher
         self.first_point = None
         self.last_point = None
+        # positions are sent in batches, one command and acknowledgement per batch
+        self.pending_positions = []
 
     def init(self):
+        self.pending_positions = []
         self.polar_sketcher.init()
         self.polar_sketcher.set_mode(Mode.HOME)
         status = self.polar_sketcher.wait_for_idle()
@@ -21,6 +24,8 @@ class PolarSketcherConsumer(Consumer):
         print("DRAW MODE?:", status)
 
     def shutdown(self):
+        self._flush_positions()
+        self.polar_sketcher.wait_until_processed()
         while True:
             status = self.polar_sketcher.update_status()
             if status.nextPosToGoIdx != status.nextPosToPlaceIdx - 1:
@@ -79,22 +84,31 @@ class PolarSketcherConsumer(Consumer):
     def _add_point_to_sketcher(self, polar_point: Tuple, canvas_size: Tuple, pen_position: int):
         amp_vel, angle_vel = self.calculate_velocities(
             self.last_point, polar_point)
-        self.polar_sketcher.add_position(
+        self.pending_positions.append((
             polar_point[0],  # amplitude
             polar_point[1],  # angle
-            pen=pen_position,
-            amplitude_velocity=amp_vel,
-            angle_velocity=angle_vel
-        )
+            pen_position,
+            amp_vel,
+            angle_vel
+        ))
+        if len(self.pending_positions) >= MAX_POSITIONS_PER_BATCH:
+            self._flush_positions()
 
         self.last_point = polar_point
         if self.first_point is None:
             self.first_point = polar_point
 
+    def _flush_positions(self):
+        if len(self.pending_positions) == 0:
+            return
+
+        self.polar_sketcher.add_positions(self.pending_positions)
+        self.pending_positions = []
+
     def calculate_velocities(self,
                              start_pos: Optional[Tuple],
                              end_pos: Tuple,
-                             max_stepper_vel=1500):
+                             max_stepper_vel=MAX_STEPPER_VELOCITY):
         if start_pos is None:
             status = self.polar_sketcher.update_status()
             start_pos = (status.amplitudeStepperPos, status.angleStepperPos)
@@ -6,11 +6,14 @@ import os
 import logging
 import json
 import argparse
+import tempfile
 from bitmap_processors.ascii_utils import image_to_ascii_svg
 from bitmap_processors.sin_wave_utils import image_to_sin_wave
 from drawing_job.job_manager import DrawingJobManager
-from path_generator import PathGenerator, ToolpathAlgorithm, PathsortAlgorithm
+from path_generator import PathGenerator, ToolpathAlgorithm, PathsortAlgorithm, SamplingMode
 from polar_sketcher_interface import PolarSketcherInterface
+from polyline_cache import PolylineCache
+from toolpath_cache import ToolpathCache
 from pymongo.collection import Collection
 from pymongo import MongoClient
 from werkzeug.exceptions import BadRequest
@@ -35,10 +38,21 @@ PLOTTER_BASE_WIDTH_MM = int(os.getenv("PLOTTER_WIDTH_MM", 35))
 PLOTTER_BASE_HEIGHT_MM = int(os.getenv("PLOTTER_HEIGHT_MM", 35))
 CANVAS_WIDTH_MM = int(os.getenv("CANVAS_WIDTH_MM", 513))
 CANVAS_HEIGHT_MM = int(os.getenv("CANVAS_HEIGHT_MM", 513))
+# number of processes used to flatten large svgs, 0 keeps it in a single thread
+PATH_FLATTEN_WORKERS = int(os.getenv("PATH_FLATTEN_WORKERS", 0))
+# number of processes sweeping the hatch toolpath heights, 0 keeps it in a single thread
+HATCH_WORKERS = int(os.getenv("HATCH_WORKERS", 0))
+# flattened drawings are cached on disk, a size of 0 disables the cache
+POLYLINE_CACHE_DIR = os.getenv("POLYLINE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "polar_sketcher_polylines"))
+POLYLINE_CACHE_SIZE_MB = int(os.getenv("POLYLINE_CACHE_SIZE_MB", 256))
+# parsed svgs and their toolpaths are kept in memory, a size of 0 disables the cache
+TOOLPATH_CACHE_SIZE_MB = int(os.getenv("TOOLPATH_CACHE_SIZE_MB", 128))
 
 job_manager: DrawingJobManager = None
 svg_collection: Collection = None
 polar_sketcher: PolarSketcherInterface = None
+polyline_cache: PolylineCache = None
+toolpath_cache: ToolpathCache = None
 
 running_jobs = {}
 
@@ -159,6 +173,10 @@ def init_path_generator(params):
     path_generator.set_offset(params["position"])
     path_generator.set_render_size(params["size"])
     path_generator.set_rotation(params["rotation"])
+    path_generator.set_flatten_workers(PATH_FLATTEN_WORKERS)
+    path_generator.set_hatch_workers(HATCH_WORKERS)
+    path_generator.set_polyline_cache(polyline_cache)
+    path_generator.set_toolpath_cache(toolpath_cache)
     try:
         toolpath_algorithm = ToolpathAlgorithm(
             params["toolpath_config"]["algorithm"])
@@ -166,6 +184,8 @@ def init_path_generator(params):
         path_generator.set_toolpath_line_number(
             params["toolpath_config"]["line_step"])
         path_generator.set_toolpath_angle(params["toolpath_config"]["angle"])
+        if "passes" in params["toolpath_config"]:
+            path_generator.set_toolpath_passes(int(params["toolpath_config"]["passes"]))
     except Exception as e:
         logging.error("failed to configure toolpath algorithm:", e)
 
@@ -175,14 +195,30 @@ def init_path_generator(params):
         path_generator.set_pathsort_algorithm(pathsort_algorithm)
         path_generator.set_pathsort_start_point(
             complex(params["pathsort_config"]["x"], params["pathsort_config"]["y"]))
+        if "optimization_time" in params["pathsort_config"]:
+            path_generator.set_pathsort_optimization_time(
+                float(params["pathsort_config"]["optimization_time"]))
     except Exception as e:
         logging.error("failed to configure pathsort algorithm:", e)
 
+    if "sampling_config" in params:
+        try:
+            sampling_mode = SamplingMode(params["sampling_config"]["mode"])
+            path_generator.set_sampling_mode(sampling_mode)
+            if "tolerance" in params["sampling_config"]:
+                path_generator.set_sampling_tolerance(
+                    float(params["sampling_config"]["tolerance"]))
+            if "max_step" in params["sampling_config"]:
+                path_generator.set_sampling_max_step(
+                    float(params["sampling_config"]["max_step"]))
+        except Exception as e:
+            logging.error("failed to configure sampling mode:", e)
+
     return path_generator
 
 
 def main():
-    global polar_sketcher, job_manager, svg_collection, db_connected
+    global polar_sketcher, job_manager, svg_collection, db_connected, polyline_cache, toolpath_cache
 
     # stubborn fix for this: https://github.com/heroku-python/flask-sockets/issues/81
     sockets.url_map.add(Rule('/updates', endpoint=get_updates, websocket=True))
@@ -199,6 +235,12 @@ def main():
     args = parser.parse_args()
     job_manager = DrawingJobManager()
 
+    if POLYLINE_CACHE_SIZE_MB > 0:
+        polyline_cache = PolylineCache(
+            POLYLINE_CACHE_DIR, POLYLINE_CACHE_SIZE_MB * 1024 * 1024)
+    if TOOLPATH_CACHE_SIZE_MB > 0:
+        toolpath_cache = ToolpathCache(TOOLPATH_CACHE_SIZE_MB * 1024 * 1024)
+
     db_connected = False
     if (args.use_db):
         try:
@@ -1,16 +1,34 @@
+import logging
 import svg_parse_utils
-from queue import Queue
-from threading import Thread
-from typing import List, Tuple, Generator
+import numpy as np
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from itertools import islice
+from multiprocessing import get_context
+from queue import Queue, Full
+from threading import Thread, Event
+from typing import List, Tuple, Generator, Optional
 from svgpathtools import Path, Line
 from enum import Enum
+from functools import partial
+from path_order_optimizer import optimize_path_order
+from path_sampler import sample_path, sample_path_adaptive
+from polyline_cache import PolylineCache, polyline_cache_key
+from toolpath_cache import ToolpathCache
 from toolpath_generation.horizontal_lines import horizontal_lines
 from toolpath_generation.connecting_lines import zigzag_lines, rect_lines
+from toolpath_generation.crosshatch import crosshatch_lines
 from sort_paths import find_closest_path, \
     find_closest_path_with_endpoint, \
     find_closest_path_with_circular_path_check, \
     find_closest_path_with_radar_scan, \
-    sort_paths
+    sort_paths, \
+    sort_paths_with_index, \
+    sort_paths_by_move_time, \
+    sort_paths_with_closed_path_entries, \
+    sort_paths_with_radar_scan
+from polar_sketcher_interface import stepper_positions, MAX_STEPPER_VELOCITY
 
 
 class ToolpathAlgorithm(Enum):
@@ -18,6 +36,7 @@ class ToolpathAlgorithm(Enum):
     LINES = "lines"
     ZIGZAG = "zigzag"
     RECTLINES = "rectlines"
+    CROSSHATCH = "crosshatch"
 
 
 def _get_toolpath_algo_func(toolpath_algo: ToolpathAlgorithm):
@@ -25,7 +44,8 @@ def _get_toolpath_algo_func(toolpath_algo: ToolpathAlgorithm):
         ToolpathAlgorithm.NONE: None,
         ToolpathAlgorithm.LINES: horizontal_lines,
         ToolpathAlgorithm.ZIGZAG: zigzag_lines,
-        ToolpathAlgorithm.RECTLINES: rect_lines
+        ToolpathAlgorithm.RECTLINES: rect_lines,
+        ToolpathAlgorithm.CROSSHATCH: crosshatch_lines,
     }
 
     if toolpath_algo not in toolpath_algorithms.keys():
@@ -40,6 +60,9 @@ class PathsortAlgorithm(Enum):
     CLOSEST_PATH_WITH_REVERSED_START = "closest_path_with_reverse"
     CLOSEST_PATH_START_ANYWHERE = "closest_path_with_start_anywhere"
     RADAR_SCAN = "radar_scan"
+    CLOSEST_PATH_INDEXED = "closest_path_indexed"
+    CLOSEST_PATH_WITH_REVERSED_START_INDEXED = "closest_path_with_reverse_indexed"
+    CLOSEST_PATH_MOVE_TIME = "closest_path_move_time"
 
 
 def _get_path_sorting_algo_func(path_sorting_algorithm: PathsortAlgorithm):
@@ -58,6 +81,45 @@ def _get_path_sorting_algo_func(path_sorting_algorithm: PathsortAlgorithm):
     return path_sort_algorithms[path_sorting_algorithm]
 
 
+def _get_path_sorter(path_sorting_algorithm: PathsortAlgorithm):
+    """
+    returns a function (start_point, paths, canvas_size) -> sorted paths,
+    the move time sorting additionally needs to_stepper
+    """
+    # these sort all paths at once instead of picking the next path step by step
+    path_sorters = {
+        PathsortAlgorithm.CLOSEST_PATH_INDEXED: sort_paths_with_index,
+        PathsortAlgorithm.CLOSEST_PATH_WITH_REVERSED_START_INDEXED: partial(sort_paths_with_index,
+                                                                            allow_reverse=True),
+        PathsortAlgorithm.CLOSEST_PATH_MOVE_TIME: sort_paths_by_move_time,
+        PathsortAlgorithm.CLOSEST_PATH_START_ANYWHERE: sort_paths_with_closed_path_entries,
+        PathsortAlgorithm.RADAR_SCAN: sort_paths_with_radar_scan,
+    }
+
+    if path_sorting_algorithm in path_sorters.keys():
+        return path_sorters[path_sorting_algorithm]
+
+    return partial(sort_paths, sorting_algo=_get_path_sorting_algo_func(path_sorting_algorithm))
+
+
+class SamplingMode(Enum):
+    UNIFORM = "uniform"
+    ADAPTIVE = "adaptive"
+
+
+@dataclass
+class SamplingSettings:
+    canvas_size: Tuple[float, float]
+    render_translate: Tuple[float, float] = (0, 0)
+    render_scale: float = 1.0
+    rotation: float = 0
+    toolpath_rotation: float = 0
+    mode: SamplingMode = SamplingMode.UNIFORM
+    tolerance: float = .1
+    max_step: Optional[float] = None
+    points_per_unit: int = 10
+
+
 def _generate_boundary_path(full_canvas_size: Tuple,
                             canvas_size: Tuple,
                             plotter_base_size: Tuple) -> Path:
@@ -100,19 +162,49 @@ class PathGenerator:
 
         self.path_sorting_algorithm = PathsortAlgorithm.NONE
         self.path_sort_start_point = complex(0, 0)
+        # seconds spent improving the sorted order with 2-opt/or-opt, 0 disables it
+        self.path_sort_optimization_time = 0
 
         self.toolpath_generation_algorithm = ToolpathAlgorithm.NONE
         self.toolpath_line_step = 10
         self.toolpath_angle = 0
+        self.toolpath_passes = 2
+
+        self.sampling_mode = SamplingMode.UNIFORM
+        self.sampling_tolerance = .1
+        self.sampling_max_step = None
+
+        # number of processes used to flatten the paths, 0 or 1 flattens them in the generator thread
+        self.flatten_workers = 0
+        self.hatch_workers = 0
+
+        self.svg_source: Optional[str] = None
+        self.polyline_cache: Optional[PolylineCache] = None
+        self.toolpath_cache: Optional[ToolpathCache] = None
 
         self.path_generator: Generator[Tuple, None, None] = None
 
     def load_svg(self, svg: str):
-        _, all_paths = svg_parse_utils.parse(svg, self.canvas_size)
+        # only drawings that come from a single svg can be cached
+        cacheable = len(self.paths) == 0
+        all_paths = None
+        geometry_key = None
+        if self.toolpath_cache is not None:
+            geometry_key = polyline_cache_key(svg, {"geometry": self.canvas_size})
+            all_paths = self.toolpath_cache.get(geometry_key)
+
+        if all_paths is None:
+            _, all_paths = svg_parse_utils.parse(svg, self.canvas_size)
+            if geometry_key is not None:
+                self.toolpath_cache.put(geometry_key, all_paths)
+
         self.add_paths(all_paths)
+        if cacheable:
+            self.svg_source = svg
 
     def add_paths(self, paths: List[Path]):
         self.paths.extend(paths)
+        self.svg_source = None
 
     def set_canvas_size(self, canvas_size: Tuple):
         self.canvas_size = canvas_size
@@ -136,6 +228,9 @@ class PathGenerator:
     def set_pathsort_start_point(self, start_point: complex):
         self.path_sort_start_point = start_point
 
+    def set_pathsort_optimization_time(self, optimization_time: float):
+        self.path_sort_optimization_time = optimization_time
+
     def set_toolpath_algorithm(self, toolpath_generation_algorithm: ToolpathAlgorithm):
         self.toolpath_generation_algorithm = toolpath_generation_algorithm
 
@@ -145,6 +240,37 @@ class PathGenerator:
     def set_toolpath_angle(self, angle: int):
         self.toolpath_angle = angle
 
+    # number of hatch passes at different angles, only used by the crosshatch toolpath
+    def set_toolpath_passes(self, passes: int):
+        self.toolpath_passes = passes
+
+    def set_sampling_mode(self, sampling_mode: SamplingMode):
+        self.sampling_mode = sampling_mode
+
+    # max deviation in mm between the sampled points and the path in adaptive mode
+    def set_sampling_tolerance(self, tolerance: float):
+        if not tolerance > 0:
+            raise ValueError("sampling tolerance has to be positive, got %s" % tolerance)
+        self.sampling_tolerance = tolerance
+
+    # max distance in mm between sampled points in adaptive mode, None means no limit
+    def set_sampling_max_step(self, max_step: float):
+        if max_step is not None and not max_step > 0:
+            raise ValueError("sampling max step has to be positive, got %s" % max_step)
+        self.sampling_max_step = max_step
+
+    def set_flatten_workers(self, workers: int):
+        self.flatten_workers = workers
+
+    def set_hatch_workers(self, workers: int):
+        self.hatch_workers = workers
+
+    def set_polyline_cache(self, polyline_cache: PolylineCache):
+        self.polyline_cache = polyline_cache
+
+    def set_toolpath_cache(self, toolpath_cache: ToolpathCache):
+        self.toolpath_cache = toolpath_cache
+
     def set_path_generator(self, path_generator: Generator[Tuple, None, None]):
         self.path_generator = path_generator
 
@@ -162,57 +288,154 @@ class PathGenerator:
         for point in point_generator(render_scale):
             yield point
 
+    def _sampling_settings(self, render_scale: float) -> SamplingSettings:
+        return SamplingSettings(canvas_size=self.canvas_size,
+                                render_translate=self.offset,
+                                render_scale=render_scale,
+                                rotation=self.rotation,
+                                toolpath_rotation=self.toolpath_angle,
+                                mode=self.sampling_mode,
+                                tolerance=self.sampling_tolerance,
+                                max_step=self.sampling_max_step)
+
     def generate_points_from_generator(self, render_scale):
-        def _generate_points(queue: Queue):
+        settings = self._sampling_settings(render_scale)
+
+        def _generate_point_batches():
             for path in self.path_generator:
-                for point in self.__get_all_points(paths=[path],
-                                                   canvas_size=self.canvas_size,
-                                                   render_translate=self.offset,
-                                                   render_scale=render_scale,
-                                                   rotation=self.rotation,
-                                                   toolpath_rotation=self.toolpath_angle):
-                    queue.put(point)
-
-        for point in _threaded_generation(_generate_points):
+                for batch in _polyline_batches(self.__flatten_paths([path], settings)):
+                    yield batch
+
+        for point in _threaded_generation(_generate_point_batches):
             yield point
 
     def generate_points_from_paths(self, render_scale):
+        settings = self._sampling_settings(render_scale)
+        cache_key = self._polyline_cache_key(render_scale)
+
+        def _generate_point_batches():
+            polylines = None
+            if cache_key is not None:
+                polylines = self.polyline_cache.get(cache_key)
+
+            if polylines is None:
+                polylines = self.__flatten_paths(self._prepare_paths(render_scale), settings,
+                                                 workers=self.flatten_workers)
+                if cache_key is not None:
+                    polylines = _recorded(polylines,
+                                          on_complete=lambda recorded: self.polyline_cache.put(cache_key, recorded))
+
+            return _polyline_batches(polylines)
+
+        for point in _threaded_generation(_generate_point_batches):
+            yield point
+
+    def _prepare_paths(self, render_scale: float):
+        """
+        applies the toolpath and the path sorting algorithms to the loaded paths
+        """
         paths = self.paths.copy()
         if self.toolpath_generation_algorithm is not ToolpathAlgorithm.NONE:
-            toolpath_algorithm_func = _get_toolpath_algo_func(
-                self.toolpath_generation_algorithm)
-            paths = list(toolpath_algorithm_func(paths,
-                                                 self.canvas_size,
-                                                 line_step=self.toolpath_line_step,
-                                                 angle=self.toolpath_angle))
+            paths = self._generate_toolpaths(paths)
 
         if self.path_sorting_algorithm is not PathsortAlgorithm.NONE:
-            path_sort_algorithm = _get_path_sorting_algo_func(
-                self.path_sorting_algorithm)
-            paths = sort_paths(paths=paths,
-                               start_point=self.path_sort_start_point,
-                               canvas_size=self.canvas_size,
-                               sorting_algo=path_sort_algorithm)
-
-        def _generate_points(queue: Queue):
-            for point in self.__get_all_points(paths=paths,
-                                               canvas_size=self.canvas_size,
-                                               render_translate=self.offset,
-                                               render_scale=render_scale,
-                                               rotation=self.rotation,
-                                               toolpath_rotation=self.toolpath_angle):
-                queue.put(point)
-
-        for point in _threaded_generation(_generate_points):
-            yield point
+            path_sorter = _get_path_sorter(self.path_sorting_algorithm)
+            if self.path_sorting_algorithm is PathsortAlgorithm.CLOSEST_PATH_MOVE_TIME:
+                path_sorter = partial(path_sorter,
+                                      to_stepper=self._stepper_positions_func(render_scale),
+                                      amplitude_velocity=MAX_STEPPER_VELOCITY,
+                                      angle_velocity=MAX_STEPPER_VELOCITY)
+            paths = path_sorter(paths=list(paths),
+                                start_point=self.path_sort_start_point,
+                                canvas_size=self.canvas_size)
+
+        if self.path_sort_optimization_time > 0:
+            paths, travel_before, travel_after = optimize_path_order(list(paths),
+                                                                     self.path_sort_start_point,
+                                                                     time_budget=self.path_sort_optimization_time)
+            logging.debug("pen up travel: %.1f -> %.1f", travel_before, travel_after)
+
+        return paths
+
+    def _generate_toolpaths(self, paths: List[Path]):
+        cache_key = self._toolpath_cache_key()
+        if cache_key is not None:
+            toolpaths = self.toolpath_cache.get(cache_key)
+            if toolpaths is not None:
+                return toolpaths
+
+        toolpath_algorithm_func = _get_toolpath_algo_func(
+            self.toolpath_generation_algorithm)
+        if self.toolpath_generation_algorithm is ToolpathAlgorithm.CROSSHATCH:
+            toolpath_algorithm_func = partial(toolpath_algorithm_func, passes=self.toolpath_passes)
+        # the toolpaths are streamed, only the path sorting needs all of them at once
+        toolpaths = toolpath_algorithm_func(paths,
+                                            self.canvas_size,
+                                            line_step=self.toolpath_line_step,
+                                            angle=self.toolpath_angle,
+                                            workers=self.hatch_workers)
+        if cache_key is not None:
+            toolpaths = _recorded(toolpaths,
+                                  on_complete=lambda recorded: self.toolpath_cache.put(cache_key, recorded))
+
+        return toolpaths
+
+    def _stepper_positions_func(self, render_scale: float):
+        """
+        returns a function that maps path points to the stepper positions the
+        sketcher moves to, the same way the points are sampled and sent to the sketcher
+        """
+        canvas_size = self.canvas_size
+        origin = complex(canvas_size[0] / 2, canvas_size[1] / 2)
+        rotation = np.exp(1j * np.radians(self.rotation - self.toolpath_angle))
+        offset = complex(self.offset[0], self.offset[1])
+
+        def _to_stepper(points: np.ndarray):
+            canvas_points = ((points - origin) * rotation + origin) * render_scale + offset
+            # the sketcher consumer mirrors the x axis
+            sketcher_points = (canvas_size[0] - canvas_points.real) + 1j * canvas_points.imag
+            return stepper_positions(canvas_size, sketcher_points)
+
+        return _to_stepper
 
-    def __get_all_points(self,
-                         paths: list[Path],
-                         canvas_size: Tuple[float, float],
-                         render_translate=(0, 0),
-                         render_scale=1.0,
-                         rotation=0,
-                         toolpath_rotation=0):
+    def _toolpath_cache_key(self) -> Optional[str]:
+        """
+        the toolpaths only depend on the svg and the toolpath settings, not on
+        the placement of the drawing or the path sorting
+        """
+        if self.toolpath_cache is None or self.svg_source is None:
+            return None
+
+        return polyline_cache_key(self.svg_source, {
+            "canvas_size": self.canvas_size,
+            "toolpath": (self.toolpath_generation_algorithm.value,
+                         self.toolpath_line_step,
+                         self.toolpath_angle,
+                         self.toolpath_passes),
+        })
+
+    def _polyline_cache_key(self, render_scale: float) -> Optional[str]:
+        if self.polyline_cache is None or self.svg_source is None:
+            return None
+
+        return polyline_cache_key(self.svg_source, {
+            "canvas_size": self.canvas_size,
+            "offset": self.offset,
+            "render_scale": render_scale,
+            "rotation": self.rotation,
+            "toolpath": (self.toolpath_generation_algorithm.value,
+                         self.toolpath_line_step,
+                         self.toolpath_angle,
+                         self.toolpath_passes),
+            "pathsort": (self.path_sorting_algorithm.value,
+                         self.path_sort_start_point,
+                         self.path_sort_optimization_time),
+            "sampling": (self.sampling_mode.value,
+                         self.sampling_tolerance,
+                         self.sampling_max_step),
+        })
+
+    def __flatten_paths(self, paths: List[Path], settings: SamplingSettings, workers=0):
         """
         # TODO center bbox
         if center:
@@ -225,61 +448,176 @@ class PathGenerator:
             render_translate[1] = -scaled_offset[1] + (height - scaled_bbox_height) / 2
         """
 
-        for path in paths:
-            for point in self.__get_points(path,
-                                           canvas_size,
-                                           render_translate,
-                                           render_scale,
-                                           rotation,
-                                           toolpath_rotation):
-                yield point
-
-            # signal end of path
-            if len(path) > 0 and path.isclosedac():
-                yield CLOSE_PATH_COMMAND
-
-            yield PATH_END_COMMAND
-
-    def __get_points(self,
-                     path: Path,
-                     canvas_size: Tuple[float, float],
-                     render_translate=(0, 0),
-                     render_scale=1.0,
-                     rotation=0,
-                     toolpath_rotation=0,
-                     points_per_unit=10):
+        if workers > 1:
+            return _flatten_in_process_pool(list(paths), settings, workers)
+
+        return (flatten_path(path, settings) for path in paths)
+
+
+def _polyline_batches(polylines):
+    for points, closed in polylines:
+        yield points
+
+        # signal end of path
+        if closed:
+            yield CLOSE_PATH_COMMAND
+
+        yield PATH_END_COMMAND
+
+
+def _recorded(polylines, on_complete):
+    """
+    passes the polylines through and hands all of them
+    to on_complete once the iteration finished
+    """
+    recorded = []
+    for polyline in polylines:
+        recorded.append(polyline)
+        yield polyline
+
+    on_complete(recorded)
+
+
+def flatten_path(path: Path, settings: SamplingSettings) -> Tuple[np.ndarray, bool]:
+    """
+    samples a path into a (n, 2) array of canvas points,
+    also returns if the path is closed
+    """
+    if settings.mode is SamplingMode.ADAPTIVE:
+        points = sample_path_adaptive(path,
+                                      settings.canvas_size,
+                                      settings.render_translate,
+                                      settings.render_scale,
+                                      settings.rotation,
+                                      settings.toolpath_rotation,
+                                      tolerance=settings.tolerance,
+                                      max_step=settings.max_step)
+    else:
+        points = sample_path(path,
+                             settings.canvas_size,
+                             settings.render_translate,
+                             settings.render_scale,
+                             settings.rotation,
+                             settings.toolpath_rotation,
+                             settings.points_per_unit)
+
+    return points, len(path) > 0 and path.isclosedac()
+
+
+def _flatten_shard(paths: List[Path], settings: SamplingSettings) -> List[Tuple[np.ndarray, bool]]:
+    return [flatten_path(path, settings) for path in paths]
+
+
+def _flatten_in_process_pool(paths: List[Path],
+                             settings: SamplingSettings,
+                             workers: int,
+                             shard_size=256) -> Generator[Tuple[np.ndarray, bool], None, None]:
+    """
+    flattens contiguous shards of paths in worker processes and yields
+    the polylines back in the original order, only a few shards are
+    in flight at a time so memory stays bounded
+    """
+    shards = (paths[i:i + shard_size] for i in range(0, len(paths), shard_size))
+    # spawn instead of fork, the server process is monkey patched by gevent
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as executor:
+        pending = deque(executor.submit(_flatten_shard, shard, settings)
+                        for shard in islice(shards, workers * 2))
         try:
-            path_len = path.length()
-        except ZeroDivisionError:
-            point = path.point(0)
-            yield ((point.real * render_scale) + render_translate[0],
-                   (point.imag * render_scale) + render_translate[1])
-            return
-        except Exception as e:
-            print("path", len(path))
-            print("error getting points:", e)
-            raise e
-
-        scaled_path_len = path_len * render_scale
-        total_points = int(scaled_path_len) * points_per_unit
-        if total_points == 0:
-            return
+            while len(pending) > 0:
+                polylines = pending.popleft().result()
+                next_shard = next(shards, None)
+                if next_shard is not None:
+                    pending.append(executor.submit(_flatten_shard, next_shard, settings))
+
+                for polyline in polylines:
+                    yield polyline
+        finally:
+            for future in pending:
+                future.cancel()
 
-        origin = complex(canvas_size[0] / 2, canvas_size[1] / 2)
-        path = path.rotated(rotation - toolpath_rotation, origin)
 
-        for i in range(0, total_points + 1):
-            point = path.point(i / total_points)
-            point = complex(point.real, point.imag)
-            scaled_point = point * render_scale
-            yield (scaled_point.real + render_translate[0],
-                   scaled_point.imag + render_translate[1])
+class _GenerationError:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+_END_OF_STREAM = object()
+
+
+def _put_until_stopped(queue: Queue, item, stop_event: Event) -> bool:
+    while not stop_event.is_set():
+        try:
+            queue.put(item, timeout=.1)
+            return True
+        except Full:
+            continue
+
+    return False
+
+
+def _chunked_producer(batch_generator, queue: Queue, stop_event: Event, chunk_size: int):
+    """
+    groups the point batches and commands of batch_generator into chunks
+    of about chunk_size points, so the queue is only touched once per chunk
+    """
+    try:
+        chunk = []
+        chunk_points = 0
+        for item in batch_generator():
+            if isinstance(item, str):
+                chunk.append(item)
+                # don't hold back finished paths while the consumer is waiting for them
+                if item == PATH_END_COMMAND and queue.empty():
+                    if not _put_until_stopped(queue, chunk, stop_event):
+                        return
+                    chunk = []
+                    chunk_points = 0
+                continue
+
+            start = 0
+            while start < len(item):
+                block = item[start:start + chunk_size - chunk_points]
+                start += len(block)
+                chunk.append(block)
+                chunk_points += len(block)
+                if chunk_points < chunk_size:
+                    continue
+
+                if not _put_until_stopped(queue, chunk, stop_event):
+                    return
+                chunk = []
+                chunk_points = 0
+
+        if len(chunk) > 0 and not _put_until_stopped(queue, chunk, stop_event):
+            return
+        _put_until_stopped(queue, _END_OF_STREAM, stop_event)
+    except BaseException as e:
+        _put_until_stopped(queue, _GenerationError(e), stop_event)
 
 
-def _threaded_generation(target, queue_size=10000):
+def _threaded_generation(batch_generator, queue_size=16, chunk_size=4096):
     queue = Queue(queue_size)
-    t = Thread(target=target, args=(queue,))
+    stop_event = Event()
+    t = Thread(target=_chunked_producer,
+               args=(batch_generator, queue, stop_event, chunk_size),
+               daemon=True)
     t.start()
 
-    while t.is_alive() or not queue.empty():
-        yield queue.get()
+    try:
+        while True:
+            chunk = queue.get()
+            if chunk is _END_OF_STREAM:
+                return
+            if isinstance(chunk, _GenerationError):
+                raise chunk.error
+
+            for item in chunk:
+                if isinstance(item, str):
+                    yield item
+                    continue
+
+                for x, y in item.tolist():
+                    yield x, y
+    finally:
+        # unblocks the producer if the consumer stopped early
+        stop_event.set()
@@ -0,0 +1,162 @@
+import time
+from typing import List, Tuple
+
+import numpy as np
+from svgpathtools import Path
+
+# ignore moves that gain less than this, they just shuffle floating point noise around
+_MIN_IMPROVEMENT = 1e-9
+
+
+def _distances(a, b) -> np.ndarray:
+    return np.abs(np.asarray(a) - np.asarray(b))
+
+
+class _PathOrder:
+    """
+    order of the paths as arrays of path indexes and flags that tell
+    if a path is drawn reversed, entries/exits are the pen down/up points
+    """
+
+    def __init__(self, start_point: complex, starts: np.ndarray, ends: np.ndarray, reversible: np.ndarray):
+        self.start_point = start_point
+        self.starts = starts
+        self.ends = ends
+        self.reversible = reversible
+        self.order = np.arange(len(starts))
+        self.flipped = np.zeros(len(starts), dtype=bool)
+        self._update()
+
+    def _update(self):
+        self.entries = np.where(self.flipped, self.ends[self.order], self.starts[self.order])
+        self.exits = np.where(self.flipped, self.starts[self.order], self.ends[self.order])
+        non_reversible = ~self.reversible[self.order]
+        self.non_reversible_prefix = np.concatenate([[0], np.cumsum(non_reversible)])
+
+    def travel(self) -> float:
+        if len(self.order) == 0:
+            return 0.0
+        return float(abs(self.entries[0] - self.start_point) +
+                     _distances(self.exits[:-1], self.entries[1:]).sum())
+
+    def _previous_exit(self, position: int) -> complex:
+        return self.start_point if position == 0 else self.exits[position - 1]
+
+    def _block_reversible(self, first: int, last: int) -> bool:
+        return self.non_reversible_prefix[last + 1] - self.non_reversible_prefix[first] == 0
+
+    def two_opt(self, first: int) -> bool:
+        """
+        reverses the best block starting at first, reversing a block
+        also reverses the drawing direction of all of its paths
+        """
+        n = len(self.order)
+        lasts = np.arange(first, n)
+        previous_exit = self._previous_exit(first)
+
+        delta = _distances(previous_exit, self.exits[first:]) - abs(previous_exit - self.entries[first])
+        following = lasts < n - 1
+        next_entries = self.entries[lasts[following] + 1]
+        delta[following] += _distances(self.entries[first], next_entries) - \
+            _distances(self.exits[lasts[following]], next_entries)
+
+        valid = self.non_reversible_prefix[lasts + 1] - self.non_reversible_prefix[first] == 0
+        delta[~valid] = np.inf
+        best = int(np.argmin(delta))
+        if delta[best] > -_MIN_IMPROVEMENT:
+            return False
+
+        last = first + best
+        self.order[first:last + 1] = self.order[first:last + 1][::-1]
+        self.flipped[first:last + 1] = ~self.flipped[first:last + 1][::-1]
+        self._update()
+        return True
+
+    def or_opt(self, first: int, length: int) -> bool:
+        """
+        moves the block of length paths starting at first to the best other
+        place in the order, reversed if that is shorter
+        """
+        n = len(self.order)
+        last = first + length - 1
+        if last >= n or n <= length:
+            return False
+
+        block_entry = self.entries[first]
+        block_exit = self.exits[last]
+        previous_exit = self._previous_exit(first)
+        removal_gain = abs(previous_exit - block_entry) - (0 if last == n - 1 else abs(previous_exit - self.entries[last + 1]))
+        if last < n - 1:
+            removal_gain += abs(block_exit - self.entries[last + 1])
+
+        # the order without the block, a gap m sits between the remaining paths m - 1 and m
+        remaining = np.concatenate([np.arange(0, first), np.arange(last + 1, n)])
+        gap_previous = np.concatenate([[self.start_point], self.exits[remaining]])
+        gap_next = self.entries[remaining]
+        closing = np.concatenate([_distances(gap_previous[:-1], gap_next), [0]])
+
+        def _insertion_costs(entry: complex, exit_point: complex) -> np.ndarray:
+            costs = _distances(gap_previous, entry) - closing
+            costs[:-1] += _distances(exit_point, gap_next)
+            return costs
+
+        costs = _insertion_costs(block_entry, block_exit)
+        reverse = self._block_reversible(first, last)
+        reversed_costs = _insertion_costs(block_exit, block_entry) if reverse else np.full(len(costs), np.inf)
+
+        best_forward = int(np.argmin(costs))
+        best_reversed = int(np.argmin(reversed_costs))
+        use_reversed = reversed_costs[best_reversed] < costs[best_forward]
+        gap = best_reversed if use_reversed else best_forward
+        delta = (reversed_costs[gap] if use_reversed else costs[gap]) - removal_gain
+        if delta > -_MIN_IMPROVEMENT:
+            return False
+
+        block_order = self.order[first:last + 1]
+        block_flipped = self.flipped[first:last + 1]
+        if use_reversed:
+            block_order = block_order[::-1]
+            block_flipped = ~block_flipped[::-1]
+
+        self.order = np.concatenate([self.order[remaining[:gap]], block_order, self.order[remaining[gap:]]])
+        self.flipped = np.concatenate([self.flipped[remaining[:gap]], block_flipped, self.flipped[remaining[gap:]]])
+        self._update()
+        return True
+
+
+def _endpoint(path, t: float) -> complex:
+    return complex(path.point(t))
+
+
+def optimize_path_order(paths: List[Path],
+                        start_point: complex,
+                        time_budget=2.0,
+                        allow_reverse=True) -> Tuple[List[Path], float, float]:
+    """
+    improves an already sorted list of paths with 2-opt and or-opt moves
+    until no move helps anymore or time_budget (seconds) is used up,
+    returns the new order and the pen up travel before and after
+    """
+    starts = np.array([_endpoint(p, 0) for p in paths], dtype=complex)
+    ends = np.array([_endpoint(p, 1) for p in paths], dtype=complex)
+    reversible = np.array([allow_reverse and hasattr(p, "reversed") for p in paths], dtype=bool)
+    path_order = _PathOrder(start_point, starts, ends, reversible)
+    travel_before = path_order.travel()
+
+    deadline = time.time() + time_budget
+    improved = True
+    while improved and time.time() < deadline:
+        improved = False
+        for first in range(len(paths)):
+            if time.time() >= deadline:
+                break
+            improved |= path_order.two_opt(first)
+            for length in (1, 2, 3):
+                improved |= path_order.or_opt(first, length)
+
+    sorted_paths = []
+    for path_idx, flipped in zip(path_order.order.tolist(), path_order.flipped.tolist()):
+        path = paths[path_idx]
+        sorted_paths.append(path.reversed() if flipped else path)
+
+    return sorted_paths, travel_before, path_order.travel()
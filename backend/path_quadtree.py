@@ -1,5 +1,7 @@
-from typing import Set, List
+import math
+from typing import Set, List, Generator
 
+import numpy as np
 from svgpathtools import Path
 
 
@@ -11,6 +13,8 @@ class PathSegment(Path):
 
 
 class SegmentIntersection:
+    __slots__ = ("intersection_point", "segment", "point_in_path", "point_in_original_path")
+
     def __init__(self,
                  intersection_point: complex,
                  segment: PathSegment,
@@ -23,6 +27,8 @@ class SegmentIntersection:
 
 
 class Point:
+    __slots__ = ("x", "y")
+
     def __init__(self, point: complex):
         self.x = point.real
         self.y = point.imag
@@ -36,6 +42,8 @@ class Point:
 
 
 class Rect:
+    __slots__ = ("origin", "width", "height")
+
     def __init__(self, origin: Point, width: float, height: float):
         self.origin = origin
         self.width = width
@@ -56,10 +64,35 @@ class Rect:
         return self.origin.x, self.origin.y, self.width, self.height
 
 
+class QueryStats:
+    """
+    counts how much work the spatial index queries do
+    """
+    __slots__ = ("queries", "visited_nodes", "candidates")
+
+    def __init__(self):
+        self.queries = 0
+        self.visited_nodes = 0
+        self.candidates = 0
+
+    def reset(self):
+        self.queries = 0
+        self.visited_nodes = 0
+        self.candidates = 0
+
+    def __str__(self) -> str:
+        per_query = max(self.queries, 1)
+        return "queries: %d, visited nodes: %d (%.1f per query), candidates: %d (%.1f per query)" % (
+            self.queries, self.visited_nodes, self.visited_nodes / per_query,
+            self.candidates, self.candidates / per_query)
+
+
 class QuadTree:
-    def __init__(self, boundary: Rect, capacity: int):
+    def __init__(self, boundary: Rect, capacity: int, stats: QueryStats = None):
         self.boundary = boundary
         self.capacity = capacity
+        # shared by all nodes of a tree
+        self.stats = stats if stats is not None else QueryStats()
         self.segments = set()
         self.is_split = False
         self.subtreeNE = None
@@ -71,37 +104,45 @@ class QuadTree:
         self.subtreeNE = QuadTree(
             Rect(self.boundary.origin,
                  int(self.boundary.width / 2), int(self.boundary.height / 2)),
-            self.capacity
+            self.capacity,
+            self.stats
         )
         self.subtreeNW = QuadTree(
             Rect(self.boundary.origin.translated(complex(self.boundary.width / 2, 0)),
                  int(self.boundary.width / 2), int(self.boundary.height / 2)),
-            self.capacity
+            self.capacity,
+            self.stats
         )
         self.subtreeSE = QuadTree(
             Rect(self.boundary.origin.translated(complex(0, self.boundary.height / 2)),
                  int(self.boundary.width / 2), int(self.boundary.height / 2)),
-            self.capacity
+            self.capacity,
+            self.stats
         )
         self.subtreeSW = QuadTree(
             Rect(self.boundary.origin.translated(complex(self.boundary.width / 2, self.boundary.height / 2)),
                  int(self.boundary.width / 2), int(self.boundary.height / 2)),
-            self.capacity
+            self.capacity,
+            self.stats
         )
         self.is_split = True
 
+    def _subtrees(self):
+        return self.subtreeNE, self.subtreeNW, self.subtreeSE, self.subtreeSW
+
     def get_all_unique_segments(self, unique_segments=None) -> set:
+        """
+        adds the segments of all nodes to unique_segments (a new set if not given)
+        """
         if unique_segments is None:
             unique_segments = set()
 
-        unique_segments = unique_segments.union(self.segments)
-        if not self.is_split:
-            return unique_segments
-
-        unique_segments = unique_segments.union(self.subtreeNE.get_all_unique_segments(unique_segments))
-        unique_segments = unique_segments.union(self.subtreeNW.get_all_unique_segments(unique_segments))
-        unique_segments = unique_segments.union(self.subtreeSE.get_all_unique_segments(unique_segments))
-        unique_segments = unique_segments.union(self.subtreeSW.get_all_unique_segments(unique_segments))
+        nodes = [self]
+        while len(nodes) > 0:
+            node = nodes.pop()
+            unique_segments.update(node.segments)
+            if node.is_split:
+                nodes.extend(node._subtrees())
 
         return unique_segments
 
@@ -124,32 +165,41 @@ class QuadTree:
         for segment in path:
             self.insert_segment(PathSegment(segment, original_path=path))
 
+    def iter_segments_in_area(self, area: Rect) -> Generator[PathSegment, None, None]:
+        """
+        lazily yields the segments of all nodes that overlap area,
+        segments that are stored in multiple nodes are yielded more than once
+        """
+        self.stats.queries += 1
+        nodes = [self]
+        while len(nodes) > 0:
+            node = nodes.pop()
+            self.stats.visited_nodes += 1
+            if not node.boundary.overlaps(area):
+                continue
+
+            self.stats.candidates += len(node.segments)
+            yield from node.segments
+            if node.is_split:
+                nodes.extend(node._subtrees())
+
     def get_segments_in_area(self, area: Rect, out=None):
+        """
+        adds the segments in area to out (a new set if not given)
+        """
         if out is None:
             out = set()
 
-        if not self.boundary.overlaps(area):
-            return out
-
-        out = out.union(self.segments)
-        if self.is_split:
-            out = out.union(self.subtreeNE.get_segments_in_area(area, out))
-            out = out.union(self.subtreeNW.get_segments_in_area(area, out))
-            out = out.union(self.subtreeSE.get_segments_in_area(area, out))
-            out = out.union(self.subtreeSW.get_segments_in_area(area, out))
-
+        out.update(self.iter_segments_in_area(area))
         return out
 
     def get_intersections(self,
                           collision_path: Path,
                           found_segments: Set[PathSegment] = None) -> List[SegmentIntersection]:
-        if found_segments is None:
-            found_segments = set()
-
+        found_segments = set() if found_segments is None else set(found_segments)
         for segment in collision_path:
             segment = Path(segment)
-            segments_in_area = self.get_segments_in_area(bbox_to_rect(*segment.bbox()))
-            found_segments = found_segments.union(segments_in_area)
+            self.get_segments_in_area(bbox_to_rect(*segment.bbox()), out=found_segments)
 
         found_intersections = []
         for segment in found_segments:
@@ -169,6 +219,173 @@ class QuadTree:
         return found_intersections
 
 
+class _IndexLevel:
+    """
+    one level of a packed segment index, node i covers bboxes[i] and
+    has the children child_start[i]:child_end[i] of the level below
+    """
+    __slots__ = ("bboxes", "child_start", "child_end")
+
+    def __init__(self, bboxes: np.ndarray, child_start: np.ndarray, child_end: np.ndarray):
+        self.bboxes = bboxes
+        self.child_start = child_start
+        self.child_end = child_end
+
+
+def _str_order(bboxes: np.ndarray, node_capacity: int) -> np.ndarray:
+    """
+    sort-tile-recursive order, vertical slices by x center and within those
+    runs of node_capacity items by y center
+    """
+    n_nodes = math.ceil(len(bboxes) / node_capacity)
+    slice_size = math.ceil(math.sqrt(n_nodes)) * node_capacity
+    x_order = np.argsort((bboxes[:, 0] + bboxes[:, 2]), kind="stable")
+    slices = np.arange(len(bboxes)) // slice_size
+    y_centers = (bboxes[x_order, 1] + bboxes[x_order, 3])
+    return x_order[np.lexsort((y_centers, slices))]
+
+
+def _pack_level(bboxes: np.ndarray, node_capacity: int) -> _IndexLevel:
+    child_start = np.arange(0, len(bboxes), node_capacity)
+    child_end = np.minimum(child_start + node_capacity, len(bboxes))
+    node_bboxes = np.empty((len(child_start), 4))
+    node_bboxes[:, 0] = np.minimum.reduceat(bboxes[:, 0], child_start)
+    node_bboxes[:, 1] = np.minimum.reduceat(bboxes[:, 1], child_start)
+    node_bboxes[:, 2] = np.maximum.reduceat(bboxes[:, 2], child_start)
+    node_bboxes[:, 3] = np.maximum.reduceat(bboxes[:, 3], child_start)
+    return _IndexLevel(node_bboxes, child_start, child_end)
+
+
+def _overlapping(bboxes: np.ndarray, min_x: float, min_y: float, max_x: float, max_y: float) -> np.ndarray:
+    # same closed bounds as Rect.overlaps
+    return (bboxes[:, 0] <= max_x) & (bboxes[:, 1] <= max_y) & (bboxes[:, 2] >= min_x) & (bboxes[:, 3] >= min_y)
+
+
+def _concatenated_ranges(starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    lengths = ends - starts
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return np.repeat(starts, lengths) + offsets
+
+
+class PackedSegmentIndex:
+    """
+    drop in replacement for QuadTree that keeps the segment bboxes in flat arrays
+    and packs them into a tree with sort-tile-recursive bulk loading,
+    the tree is built on the first query after segments were inserted
+    """
+
+    def __init__(self, boundary: Rect, capacity: int, stats: QueryStats = None):
+        self.boundary = boundary
+        self.capacity = capacity
+        self.stats = stats if stats is not None else QueryStats()
+        self.segments: List[PathSegment] = []
+        self.bboxes = np.empty((0, 4))
+        self._pending_segments: List[PathSegment] = []
+        self._pending_bboxes = []
+        self._levels: List[_IndexLevel] = []
+
+    def insert_segment(self, segment: Path):
+        xmin, xmax, ymin, ymax = segment.bbox()
+        if not self.boundary.overlaps(bbox_to_rect(xmin, xmax, ymin, ymax)):
+            return
+
+        self._pending_segments.append(segment)
+        self._pending_bboxes.append((xmin, ymin, xmax, ymax))
+
+    def insert_path(self, path: Path):
+        for segment in path:
+            self.insert_segment(PathSegment(segment, original_path=path))
+
+    def _build(self):
+        segments = self.segments + self._pending_segments
+        bboxes = np.concatenate([self.bboxes, np.array(self._pending_bboxes, dtype=float).reshape((-1, 4))])
+        self._pending_segments = []
+        self._pending_bboxes = []
+
+        order = _str_order(bboxes, self.capacity)
+        self.segments = [segments[i] for i in order.tolist()]
+        self.bboxes = bboxes[order]
+
+        self._levels = []
+        level_bboxes = self.bboxes
+        while len(level_bboxes) > 0:
+            level = _pack_level(level_bboxes, self.capacity)
+            if len(level_bboxes) > self.capacity:
+                # reorder the nodes themselves for the next level up, their children stay the same
+                node_order = _str_order(level.bboxes, self.capacity)
+                level = _IndexLevel(level.bboxes[node_order],
+                                    level.child_start[node_order],
+                                    level.child_end[node_order])
+            self._levels.append(level)
+            if len(level.bboxes) == 1:
+                break
+            level_bboxes = level.bboxes
+
+    def _query(self, area: Rect) -> np.ndarray:
+        if len(self._pending_segments) > 0:
+            self._build()
+        if len(self._levels) == 0:
+            return np.empty(0, dtype=np.int64)
+
+        self.stats.queries += 1
+        bounds = (area.origin.x, area.origin.y, area.origin.x + area.width, area.origin.y + area.height)
+        nodes = np.arange(len(self._levels[-1].bboxes))
+        for level in reversed(self._levels):
+            self.stats.visited_nodes += len(nodes)
+            nodes = nodes[_overlapping(level.bboxes[nodes], *bounds)]
+            nodes = _concatenated_ranges(level.child_start[nodes], level.child_end[nodes])
+
+        segment_idxs = np.sort(nodes[_overlapping(self.bboxes[nodes], *bounds)])
+        self.stats.candidates += len(segment_idxs)
+        return segment_idxs
+
+    def get_all_unique_segments(self, unique_segments=None) -> set:
+        if len(self._pending_segments) > 0:
+            self._build()
+        if unique_segments is None:
+            unique_segments = set()
+
+        unique_segments.update(self.segments)
+        return unique_segments
+
+    def iter_segments_in_area(self, area: Rect) -> Generator[PathSegment, None, None]:
+        for i in self._query(area).tolist():
+            yield self.segments[i]
+
+    def get_segments_in_area(self, area: Rect, out=None):
+        if out is None:
+            out = set()
+
+        out.update(self.iter_segments_in_area(area))
+        return out
+
+    def get_intersections(self,
+                          collision_path: Path,
+                          found_segments: Set[PathSegment] = None) -> List[SegmentIntersection]:
+        segment_idxs = [self._query(bbox_to_rect(*Path(segment).bbox())) for segment in collision_path]
+        segment_idxs = np.unique(np.concatenate(segment_idxs)) if len(segment_idxs) > 0 else []
+        candidates = [self.segments[i] for i in segment_idxs]
+        if found_segments is not None:
+            candidates.extend(found_segments.difference(candidates))
+
+        found_intersections = []
+        for segment in candidates:
+            try:
+                path_intersections = segment.intersect(collision_path, tol=1e-12)
+                for (T1, _seg1, _t1), (_T2, _seg2, _t2) in path_intersections:
+                    point = segment.point(T1)
+                    point_in_path = T1
+                    point_in_original_path = segment.original_path.t2T(segment.original_segment, T1)
+                    found_intersections.append(
+                        SegmentIntersection(point, segment, point_in_path, point_in_original_path))
+            except Exception as e:
+                print("An error occurred trying to get an intersection:", e)
+                print("Segment D:", segment.d())
+                print("Collision Path D:", collision_path.d())
+
+        return found_intersections
+
+
 def bbox_to_rect(xmin: float, xmax: float, ymin: float, ymax: float, expansion=5) -> Rect:
     origin = Point(complex(xmin - expansion, ymin - expansion))
     width = (xmax - xmin) + expansion
@@ -0,0 +1,240 @@
+import math
+from typing import Tuple
+
+import numpy as np
+from svgpathtools import Path, Line, QuadraticBezier, CubicBezier, Arc
+
+
+def segment_ends(path: Path) -> np.ndarray:
+    """
+    path T at the end of every segment
+    """
+    # accumulate the same way Path.point does so the segment lookup
+    # ends up on exactly the same boundaries
+    path._calc_lengths()
+    ends = []
+    segment_end = 0
+    for length in path._lengths:
+        segment_end = segment_end + length
+        ends.append(segment_end)
+
+    return np.array(ends, dtype=float)
+
+
+def _line_points(segment: Line, t: np.ndarray) -> np.ndarray:
+    distance = segment.end - segment.start
+    return segment.start + distance * t
+
+
+def _quadratic_points(segment: QuadraticBezier, t: np.ndarray) -> np.ndarray:
+    tc = 1 - t
+    return tc * tc * segment.start + 2 * tc * t * segment.control + t * t * segment.end
+
+
+def _cubic_points(segment: CubicBezier, t: np.ndarray) -> np.ndarray:
+    start, control1, control2, end = segment.bpoints()
+    a = 3 * (control1 - start)
+    b = 3 * (start + control2) - 6 * control1
+    c = -start + 3 * (control1 - control2) + end
+    return start + t * (a + t * (b + t * c))
+
+
+def _arc_points(segment: Arc, t: np.ndarray) -> np.ndarray:
+    angle = (segment.theta + t * segment.delta) * math.pi / 180
+    cosphi = segment.rot_matrix.real
+    sinphi = segment.rot_matrix.imag
+    rx = segment.radius.real
+    ry = segment.radius.imag
+
+    # libm cos/sin instead of the numpy ufuncs, those are allowed
+    # to differ in the last bit on some platforms
+    cos_angle = np.fromiter(map(math.cos, angle.tolist()), dtype=float, count=len(angle))
+    sin_angle = np.fromiter(map(math.sin, angle.tolist()), dtype=float, count=len(angle))
+
+    x = rx * cosphi * cos_angle - ry * sinphi * sin_angle + segment.center.real
+    y = rx * sinphi * cos_angle + ry * cosphi * sin_angle + segment.center.imag
+    return x + y * 1j
+
+
+_SEGMENT_EVALUATORS = {
+    Line: _line_points,
+    QuadraticBezier: _quadratic_points,
+    CubicBezier: _cubic_points,
+    Arc: _arc_points,
+}
+
+
+def segment_points(segment, t: np.ndarray) -> np.ndarray:
+    """
+    evaluates a segment for a whole array of t values at once,
+    gives the same values as calling segment.point for each t
+    """
+    evaluator = _SEGMENT_EVALUATORS.get(type(segment))
+    if evaluator is None:
+        return np.array([segment.point(v) for v in t.tolist()], dtype=complex)
+
+    return np.asarray(evaluator(segment, t), dtype=complex)
+
+
+def path_points(path: Path, T: np.ndarray) -> np.ndarray:
+    """
+    vectorized equivalent of calling path.point for each T
+    """
+    if len(path) == 0:
+        raise ValueError("This path contains no segments!")
+
+    ends = segment_ends(path)
+    segment_idxs = np.searchsorted(ends, T, side="left")
+    segment_idxs = np.minimum(segment_idxs, len(ends) - 1)
+    segment_starts = np.where(segment_idxs > 0, ends[segment_idxs - 1], 0.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        segment_t = (T - segment_starts) / (ends[segment_idxs] - segment_starts)
+
+    # same shortcuts as Path.point
+    at_start = T == 0.0
+    segment_idxs[at_start] = 0
+    segment_t[at_start] = 0.0
+    at_end = T == 1.0
+    segment_idxs[at_end] = len(ends) - 1
+    segment_t[at_end] = 1.0
+
+    points = np.empty(len(T), dtype=complex)
+
+    # lines are by far the most common segments, evaluate all of them in one go
+    segments = path._segments
+    is_line = np.array([type(segment) is Line for segment in segments])
+    line_mask = is_line[segment_idxs]
+    if line_mask.any():
+        line_starts = np.array([segment.start if type(segment) is Line else 0j for segment in segments])
+        line_distances = np.array([segment.end - segment.start if type(segment) is Line else 0j
+                                   for segment in segments])
+        line_idxs = segment_idxs[line_mask]
+        points[line_mask] = line_starts[line_idxs] + line_distances[line_idxs] * segment_t[line_mask]
+
+    # consecutive points on the same curve are evaluated as one slice
+    curve_positions = np.flatnonzero(~line_mask)
+    if len(curve_positions) > 0:
+        curve_idxs = segment_idxs[curve_positions]
+        boundaries = np.flatnonzero(np.diff(curve_idxs)) + 1
+        for chunk in np.split(curve_positions, boundaries):
+            segment = segments[segment_idxs[chunk[0]]]
+            points[chunk] = segment_points(segment, segment_t[chunk])
+
+    return points
+
+
+def sample_path(path: Path,
+                canvas_size: Tuple[float, float],
+                render_translate=(0, 0),
+                render_scale=1.0,
+                rotation=0,
+                toolpath_rotation=0,
+                points_per_unit=10) -> np.ndarray:
+    """
+    samples a path uniformly in T and returns the batch of
+    points as a (n, 2) array in canvas coordinates
+    """
+    try:
+        path_len = path.length()
+    except ZeroDivisionError:
+        point = path.point(0)
+        return np.array([[(point.real * render_scale) + render_translate[0],
+                          (point.imag * render_scale) + render_translate[1]]])
+    except Exception as e:
+        print("path", len(path))
+        print("error getting points:", e)
+        raise e
+
+    scaled_path_len = path_len * render_scale
+    total_points = int(scaled_path_len) * points_per_unit
+    if total_points == 0:
+        return np.empty((0, 2))
+
+    origin = complex(canvas_size[0] / 2, canvas_size[1] / 2)
+    path = path.rotated(rotation - toolpath_rotation, origin)
+
+    T = np.arange(total_points + 1) / total_points
+    scaled_points = path_points(path, T) * render_scale
+
+    points = np.empty((len(scaled_points), 2))
+    points[:, 0] = scaled_points.real + render_translate[0]
+    points[:, 1] = scaled_points.imag + render_translate[1]
+    return points
+
+
+def _max_second_derivative(segment) -> float:
+    """
+    upper bound of |B''(t)| over the segment, used to bound the chord error
+    """
+    if isinstance(segment, QuadraticBezier):
+        return 2 * abs(segment.start - 2 * segment.control + segment.end)
+    if isinstance(segment, CubicBezier):
+        start, control1, control2, end = segment.bpoints()
+        return 6 * max(abs(start - 2 * control1 + control2),
+                       abs(control1 - 2 * control2 + end))
+    if isinstance(segment, Arc):
+        delta = math.radians(segment.delta)
+        return max(segment.radius.real, segment.radius.imag) * delta * delta
+
+    return math.inf
+
+
+def segment_subdivisions(segment, tolerance: float, max_step=None) -> int:
+    # the machine interpolates in polar space, so long moves may need to be split up
+    min_subdivisions = 1
+    if max_step is not None:
+        min_subdivisions = max(1, math.ceil(segment.length() / max_step))
+
+    if isinstance(segment, Line):
+        return min_subdivisions
+
+    # the chord of a parameter step h deviates from the curve by at most h^2 * max|B''| / 8
+    max_second_derivative = _max_second_derivative(segment)
+    if math.isinf(max_second_derivative):
+        return max(min_subdivisions, math.ceil(segment.length() / tolerance))
+
+    return max(min_subdivisions, math.ceil(math.sqrt(max_second_derivative / (8 * tolerance))))
+
+
+def sample_path_adaptive(path: Path,
+                         canvas_size: Tuple[float, float],
+                         render_translate=(0, 0),
+                         render_scale=1.0,
+                         rotation=0,
+                         toolpath_rotation=0,
+                         tolerance=.1,
+                         max_step=None) -> np.ndarray:
+    """
+    samples a path so that the polyline between the points never deviates
+    more than tolerance (in canvas units) from the curve,
+    lines only get their endpoints unless max_step limits the distance between points
+    """
+    if len(path) == 0:
+        return np.empty((0, 2))
+
+    origin = complex(canvas_size[0] / 2, canvas_size[1] / 2)
+    path = path.rotated(rotation - toolpath_rotation, origin)
+
+    # tolerance is given after scaling, bring it back to path units
+    path_tolerance = tolerance / render_scale
+    path_max_step = max_step / render_scale if max_step is not None else None
+    segment_batches = []
+    for idx, segment in enumerate(path):
+        subdivisions = segment_subdivisions(segment, path_tolerance, path_max_step)
+        t = np.arange(subdivisions + 1) / subdivisions
+        if idx > 0:
+            # the start is the end of the previous segment
+            t = t[1:]
+        segment_batches.append(segment_points(segment, t))
+
+    scaled_points = np.concatenate(segment_batches) * render_scale
+
+    # drop repeated points from zero length segments
+    keep = np.ones(len(scaled_points), dtype=bool)
+    keep[1:] = scaled_points[1:] != scaled_points[:-1]
+    scaled_points = scaled_points[keep]
+
+    points = np.empty((len(scaled_points), 2))
+    points[:, 0] = scaled_points.real + render_translate[0]
+    points[:, 1] = scaled_points.imag + render_translate[1]
+    return points
@@ -2,18 +2,60 @@ import os
 import time
 import serial  # is actually pyserial
 import struct
+import numpy as np
 from cmath import polar, pi
+from collections import OrderedDict
 from enum import Enum
-from typing import Tuple
-from threading import Thread, Event
+from typing import Tuple, Optional, Iterable, List
+from threading import Thread, Event, Condition
 
 CMD_PROCESSED_SUCCESSFULLY_MSG = "OK"
 CMD_PROCESSING_FAILURE_MSG = "FAIL"
 SETUP_DONE_MSG = "SETUP DONE"
-STATUS_START_MSG = "STATUS START"
+STATUS_FRAME_MSG = "STATUS FRAME"
+STATUS_FRAME_LINE = STATUS_FRAME_MSG.encode()
 UNRECOGNIZED_CMD_MSG = "DID NOT RECOGNIZE COMMAND TYPE"
 CHECKSUM_MISMATCH = "CHECKSUM MISMATCH"
 
+# TODO read calibration from a file or something
+TRAVELABLE_DISTANCE_STEPS = 74810
+STEPS_PER_MM = 157.16
+MIN_AMPLITUDE_POS = 5809
+MAX_AMPLITUDE_POS = 80619
+MAX_ANGLE_POS = 28760
+MAX_ENCODER_COUNT = 2450
+# steps per second of the faster axis of a move, the other axis is slowed down to arrive at the same time
+MAX_STEPPER_VELOCITY = 1500
+
+# positions carried by one ADD_POSITIONS command, has to match maxPositionsPerBatch in the firmware
+MAX_POSITIONS_PER_BATCH = 32
+# commands sent before waiting for their acknowledgement, a full window
+# of the biggest commands has to fit in the 2048 byte rx buffer of the controller
+COMMAND_WINDOW_SIZE = 3
+# a command without acknowledgement after this many seconds is sent again
+ACK_TIMEOUT = 1
+# how often the sender checks for timed out commands and, while the
+# position buffer of the controller is full, asks for its free slots
+POLL_INTERVAL = .1
+
+# binary status frame that follows a STATUS FRAME line, see printStatus in the firmware:
+# version, payload length, payload, checksum (sum of the bytes before it, 16 bits)
+STATUS_FRAME_VERSION = 1
+STATUS_FRAME_HEADER = struct.Struct("<BB")
+STATUS_FRAME_CHECKSUM = struct.Struct("<H")
+# mode, flags, amplitude pos/target/speed, angle pos/target/speed, travelable distance steps,
+# steps per mm, min/max amplitude pos, max angle pos, encoder count, max encoder count,
+# next position to place/go
+STATUS_PAYLOAD = struct.Struct("<BBiiiiiiifiiiqiii")
+# bits of the flags byte
+STATUS_CALIBRATED = 1 << 0
+STATUS_CALIBRATING = 1 << 1
+STATUS_ANGLE_CORRECTION_ENABLED = 1 << 2
+STATUS_MIN_AMPLITUDE_BUTTON = 1 << 3
+STATUS_MAX_AMPLITUDE_BUTTON = 1 << 4
+STATUS_MIN_ANGLE_BUTTON = 1 << 5
+STATUS_MAX_ANGLE_BUTTON = 1 << 6
+
 
 class Mode(Enum):
     IDLE = 0
@@ -29,6 +71,9 @@ class Command(Enum):
     CALIBRATE = 3
     ADD_POSITION = 4
     SET_ANGLE_CORRECTION = 5
+    ADD_POSITIONS = 6
+    RESET_SEQUENCE = 7
+    PING = 8
 
 
 class Status:
@@ -57,35 +102,47 @@ class Status:
         self.maxAngleButtonPressed = 0
         self.angleCorrectionEnabled = False
 
-    def update_status(self, serial_conn: serial.Serial):
-        self.currentMode = Mode(int(serial_conn.readline()))
-        self.calibrated = bool(int(serial_conn.readline()))
-        self.calibrating = bool(int(serial_conn.readline()))
-
-        self.amplitudeStepperPos = int(serial_conn.readline())
-        self.amplitudeStepperTargetPos = int(serial_conn.readline())
-        self.amplitudeStepperSpeed = int(serial_conn.readline())
-
-        self.angleStepperPos = int(serial_conn.readline())
-        self.angleStepperTargetPos = int(serial_conn.readline())
-        self.angleStepperSpeed = int(serial_conn.readline())
-
-        self.travelableDistanceSteps = int(serial_conn.readline())
-        self.stepsPerMm = float(serial_conn.readline())
-        self.minAmplitudePos = int(serial_conn.readline())
-        self.maxAmplituePos = int(serial_conn.readline())
-        self.maxAnglePos = int(serial_conn.readline())
-        self.encoderCount = int(serial_conn.readline())
-        self.maxEncoderCount = int(serial_conn.readline())
-        self.nextPosToPlaceIdx = int(serial_conn.readline())
-        self.nextPosToGoIdx = int(serial_conn.readline())
-
-        self.minAmplitudeButtonPressed = int(serial_conn.readline())
-        self.maxAmplitudeButtonPressed = int(serial_conn.readline())
-        self.minAngleButtonPressed = int(serial_conn.readline())
-        self.maxAngleButtonPressed = int(serial_conn.readline())
-
-        self.angleCorrectionEnabled = bool(int(serial_conn.readline()))
+    def update_from_frame(self, frame: bytes) -> bool:
+        """
+        decodes a complete status frame, header and checksum included. a frame that is cut
+        short, corrupted or of another version is skipped and the status stays as it was
+        """
+        header_size, checksum_size = STATUS_FRAME_HEADER.size, STATUS_FRAME_CHECKSUM.size
+        if len(frame) < header_size + checksum_size:
+            print("status frame incomplete:", frame)
+            return False
+
+        version, length = STATUS_FRAME_HEADER.unpack_from(frame)
+        if len(frame) != header_size + length + checksum_size:
+            print("status frame incomplete:", frame)
+            return False
+
+        checksum, = STATUS_FRAME_CHECKSUM.unpack_from(frame, header_size + length)
+        if checksum != sum(frame[:header_size + length]) & 0xffff:
+            print("status frame checksum mismatch:", frame)
+            return False
+
+        if version != STATUS_FRAME_VERSION or length != STATUS_PAYLOAD.size:
+            print("status frame version %d with %d bytes is not supported" % (version, length))
+            return False
+
+        (mode, flags,
+         self.amplitudeStepperPos, self.amplitudeStepperTargetPos, self.amplitudeStepperSpeed,
+         self.angleStepperPos, self.angleStepperTargetPos, self.angleStepperSpeed,
+         self.travelableDistanceSteps, self.stepsPerMm,
+         self.minAmplitudePos, self.maxAmplituePos, self.maxAnglePos,
+         self.encoderCount, self.maxEncoderCount,
+         self.nextPosToPlaceIdx, self.nextPosToGoIdx) = STATUS_PAYLOAD.unpack_from(frame, header_size)
+
+        self.currentMode = Mode(mode)
+        self.calibrated = bool(flags & STATUS_CALIBRATED)
+        self.calibrating = bool(flags & STATUS_CALIBRATING)
+        self.angleCorrectionEnabled = bool(flags & STATUS_ANGLE_CORRECTION_ENABLED)
+        self.minAmplitudeButtonPressed = int(bool(flags & STATUS_MIN_AMPLITUDE_BUTTON))
+        self.maxAmplitudeButtonPressed = int(bool(flags & STATUS_MAX_AMPLITUDE_BUTTON))
+        self.minAngleButtonPressed = int(bool(flags & STATUS_MIN_ANGLE_BUTTON))
+        self.maxAngleButtonPressed = int(bool(flags & STATUS_MAX_ANGLE_BUTTON))
+        return True
 
     def __str__(self) -> str:
         out_str = ""
@@ -116,17 +173,94 @@ class Status:
         return out_str
 
 
+class SerialParser:
+    """
+    splits the bytes received from the controller into lines and the binary frames that follow
+    a STATUS FRAME line. the bytes can be fed in whatever chunks they arrive in, only complete
+    messages come out and the rest is kept for the next chunk
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        # the line announcing the frame that is still being received
+        self.frame_line: Optional[bytes] = None
+
+    def feed(self, data: bytes) -> List[Tuple[bytes, Optional[bytes]]]:
+        """
+        returns the completed (line, frame) pairs in the order they were received,
+        frame is None for the lines that are not followed by one
+        """
+        buffer = self.buffer
+        buffer += data
+        messages = []
+        read_idx = 0
+        while True:
+            if self.frame_line is not None:
+                # a frame starts with its version and payload length and ends with a checksum
+                if len(buffer) - read_idx < STATUS_FRAME_HEADER.size:
+                    break
+                frame_size = STATUS_FRAME_HEADER.size + buffer[read_idx + 1] + STATUS_FRAME_CHECKSUM.size
+                if len(buffer) - read_idx < frame_size:
+                    break
+                messages.append((self.frame_line, bytes(buffer[read_idx:read_idx + frame_size])))
+                self.frame_line = None
+                read_idx += frame_size
+                continue
+
+            line_end = buffer.find(b'\n', read_idx)
+            if line_end < 0:
+                break
+            line = bytes(buffer[read_idx:line_end])
+            read_idx = line_end + 1
+            if line == STATUS_FRAME_LINE:
+                self.frame_line = line
+            else:
+                messages.append((line, None))
+
+        # drop everything that was handled at once instead of per message
+        del buffer[:read_idx]
+        return messages
+
+    def pending(self) -> bytes:
+        return bytes(self.buffer)
+
+
+class SentCommand:
+    """
+    a command waiting for its acknowledgement, failed_time is
+    set when the controller answered with a FAIL for it
+    """
+    __slots__ = ("seq", "msg", "n_positions", "sent_time", "failed_time")
+
+    def __init__(self, seq: int, msg: bytes, n_positions=0):
+        self.seq = seq
+        self.msg = msg
+        self.n_positions = n_positions
+        self.sent_time = 0.
+        self.failed_time: Optional[float] = None
+
+
 class PolarSketcherInterface:
-    def __init__(self, baud_rate=115200, port=None, angle_correction=True):
+    def __init__(self, baud_rate=115200, port=None, angle_correction=True, window_size=COMMAND_WINDOW_SIZE):
         self.port = port if port is not None else find_serial_port()
         self.baud_rate = baud_rate
         self.status = Status()
-        self.__command_processed_event = Event()
         self.__setup_done_event = Event()
         self.__stop = False
         self.__serial_reader = None
-        self.__needs_retry = False
         self.__last_sent_msg = b''
+
+        # every command carries a sequence number, up to window_size of them are sent
+        # without waiting and the acks/fails of the controller reference that number
+        self.__window_size = window_size
+        self.__next_seq = 0
+        self.__in_flight: OrderedDict[int, SentCommand] = OrderedDict()
+        self.__in_flight_changed = Condition()
+
+        # free slots of the position buffer in the last ack of the controller,
+        # positions are only sent when they fit (see __position_credits)
+        self.__free_position_slots = 0
+        self.__last_ping_time = 0.
         self.__angle_correction_enabled = angle_correction
 
         self.serial = None
@@ -138,12 +272,14 @@ class PolarSketcherInterface:
             self.stop()
             return
 
-        self.__command_processed_event.clear()
         self.__setup_done_event.clear()
         self.status = Status()
         self.__stop = False
-        self.__needs_retry = False
         self.__last_sent_msg = b''
+        self.__next_seq = 0
+        self.__in_flight.clear()
+        self.__free_position_slots = 0
+        self.__last_ping_time = 0.
 
         # open serial and start processing
         self.serial = serial.Serial(
@@ -160,6 +296,11 @@ class PolarSketcherInterface:
         # self.serial.setDTR(True)
         # self.__setup_done_event.wait(1)
 
+        # the controller might still expect the sequence numbers of a previous connection.
+        # a reset that arrives after later commands would make the controller expect them again,
+        # so nothing else is sent before it is acknowledged, however long that takes
+        self.__send(self.__encode_int(Command.RESET_SEQUENCE.value))
+        self.wait_until_processed()
         self.set_angle_correction(self.__angle_correction_enabled)
         self.__initilised = True
 
@@ -177,57 +318,157 @@ class PolarSketcherInterface:
         return struct.pack("<f", val)
 
     def __process_serial(self):
-        received = b''
+        parser = SerialParser()
+        self.serial.timeout = 1
         while not self.__stop:
             try:
-                start_time = time.time()
-                serial._timeout = 1
-                self.serial.timeout = 1
-                received += self.serial.read()
-                if not received.endswith(b'\n'):
-                    if time.time() - start_time > 1:
+                # blocks for the first byte, then takes everything that already arrived
+                received = self.serial.read(max(1, self.serial.in_waiting))
+                if len(received) == 0:
+                    if len(parser.pending()) > 0:
                         # this means a timeout occurred, let's see whats in the buffer
-                        print("TIMOUT, CURRENT BUFFER:", str(received))
+                        print("TIMOUT, CURRENT BUFFER:", parser.pending())
                         print("LAST SENT MSG:", str(self.__last_sent_msg))
                     continue
 
-                line = received.split(b'\n')[0]
-                received = b''
-
-                try:
-                    line = line.decode("utf-8")
-                except Exception as e:
-                    pass
-
-                if line == CMD_PROCESSED_SUCCESSFULLY_MSG:
-                    self.__command_processed_event.set()
-                elif line == CMD_PROCESSING_FAILURE_MSG:
-                    self.__needs_retry = True
-                    self.__command_processed_event.set()
-                elif line == STATUS_START_MSG:
-                    self.status.update_status(self.serial)
-                elif line == SETUP_DONE_MSG:
-                    self.__setup_done_event.set()
-                elif line == UNRECOGNIZED_CMD_MSG:
-                    # TODO implement resyncing if necessary
-                    print("NEEDS RESYNC")
-                    pass
-                else:
-                    print("serial:", line)
+                for line, frame in parser.feed(received):
+                    self.__handle_message(line, frame)
             except Exception as e:
                 print("stopped reading from serial because:", e)
                 return
 
-    def __wait_for_command_processing(self, max_wait=1):
+    def __handle_message(self, line: bytes, frame: Optional[bytes]):
+        if frame is not None:
+            self.status.update_from_frame(frame)
+            return
+
+        try:
+            line = line.decode("utf-8")
+        except Exception as e:
+            pass
+
+        # acks and fails are followed by the sequence number of their
+        # command and the free slots of the position buffer
+        reply, seq, free_position_slots = (line.split(" ") + ["", ""])[:3] \
+            if isinstance(line, str) else (line, "", "")
+        if reply in (CMD_PROCESSED_SUCCESSFULLY_MSG, CMD_PROCESSING_FAILURE_MSG) and seq.isdigit():
+            if free_position_slots.isdigit():
+                self.__free_position_slots = int(free_position_slots)
+            if reply == CMD_PROCESSED_SUCCESSFULLY_MSG:
+                self.__command_processed(int(seq))
+            else:
+                self.__command_failed(int(seq))
+        elif line == SETUP_DONE_MSG:
+            self.__setup_done_event.set()
+        elif line == UNRECOGNIZED_CMD_MSG:
+            # TODO implement resyncing if necessary
+            print("NEEDS RESYNC")
+            pass
+        else:
+            print("serial:", line)
+
+    def __command_processed(self, seq: int):
+        # the controller processes the commands in order, so this
+        # also acknowledges the earlier ones whose ack got lost
+        with self.__in_flight_changed:
+            for acked_seq in [in_flight_seq for in_flight_seq in self.__in_flight if in_flight_seq <= seq]:
+                del self.__in_flight[acked_seq]
+            self.__in_flight_changed.notify_all()
+
+    def __command_failed(self, seq: int):
+        # the controller answers in order, earlier commands that are still waiting for an answer
+        # never made it and are sent again with this one. that only holds for the ones sent before
+        # the failed command, the ones sent again since are answered after it
+        with self.__in_flight_changed:
+            failed = self.__in_flight.get(seq)
+            if failed is None:
+                return
+
+            now = time.time()
+            for command in self.__in_flight.values():
+                if command.seq < seq and command.failed_time is None and command.sent_time <= failed.sent_time:
+                    command.failed_time = now
+            failed.failed_time = now
+            self.__in_flight_changed.notify_all()
+
+    def __transmit(self, command: SentCommand):
+        command.sent_time = time.time()
+        command.failed_time = None
+        self.write_message(command.msg)
+
+    def __service_in_flight(self):
+        """
+        waits a bit for acknowledgements, then sends the failed and the timed out
+        commands again in sequence order, the controller only accepts them in order.
+        has to be called with __in_flight_changed held
+        """
+        self.__in_flight_changed.wait(timeout=POLL_INTERVAL)
+        now = time.time()
+        for command in list(self.__in_flight.values()):
+            if command.failed_time is not None:
+                self.__transmit(command)
+            elif command.failed_time is None and now - command.sent_time > ACK_TIMEOUT:
+                print("command %d not processed yet, sending it again" % command.seq)
+                self.__transmit(command)
+
+    def __send(self, msg: bytes, max_wait: Optional[float] = None, n_positions=0) -> bool:
+        """
+        sends a command as soon as the window has room for it. with max_wait it also waits
+        for the acknowledgement and returns False if it didn't come within max_wait seconds
+        """
+        with self.__in_flight_changed:
+            while len(self.__in_flight) >= self.__window_size:
+                self.__service_in_flight()
+
+            command = SentCommand(self.__next_seq, self.__encode_int(self.__next_seq) + msg, n_positions)
+            self.__next_seq += 1
+            self.__in_flight[command.seq] = command
+            self.__transmit(command)
+
+        if max_wait is None:
+            return True
+        return self.__wait_for_acks([command.seq], max_wait)
+
+    def __wait_for_acks(self, seqs: Iterable[int], max_wait: Optional[float] = None) -> bool:
         start_time = time.time()
-        while not self.__command_processed_event.wait(timeout=.1):
-            if time.time() - start_time > max_wait:
-                return False
+        with self.__in_flight_changed:
+            while any(seq in self.__in_flight for seq in seqs):
+                if max_wait is not None and time.time() - start_time > max_wait:
+                    return False
+                self.__service_in_flight()
 
-        self.__command_processed_event.clear()
         return True
 
+    def __position_credits(self) -> int:
+        """
+        positions that still fit in the buffer of the controller: the free slots it advertised
+        minus the positions of every command it didn't acknowledge yet
+        """
+        return self.__free_position_slots - sum(command.n_positions for command in self.__in_flight.values())
+
+    def __wait_for_position_credits(self) -> int:
+        with self.__in_flight_changed:
+            while self.__position_credits() <= 0:
+                # the free slots only come with acks, ask for them when there is nothing to ack
+                if len(self.__in_flight) == 0 and time.time() - self.__last_ping_time >= POLL_INTERVAL:
+                    self.__last_ping_time = time.time()
+                    self.__send(self.__encode_int(Command.PING.value))
+                self.__service_in_flight()
+
+            return self.__position_credits()
+
+    def wait_until_processed(self, max_wait: Optional[float] = None) -> bool:
+        """
+        waits until the controller acknowledged every command sent so far
+        """
+        with self.__in_flight_changed:
+            seqs = list(self.__in_flight.keys())
+        return self.__wait_for_acks(seqs, max_wait)
+
     def write_message(self, msg: bytes):
+        """
+        frames and writes a message as it is, commands go through __send to get a sequence number
+        """
         msg = b'<<<' + msg + b'>>>'
         self.serial.write(msg)
         self.__last_sent_msg = msg
@@ -235,34 +476,20 @@ class PolarSketcherInterface:
     def set_mode(self, mode: Mode) -> Status:
         msg = self.__encode_int(Command.SET_MODE.value)
         msg += self.__encode_int(mode.value)
-        self.write_message(msg)
-        self.__wait_for_command_processing()
+        self.__send(msg, max_wait=ACK_TIMEOUT)
         return self.update_status()
 
     def calibrate(self) -> Status:
         msg = self.__encode_int(Command.CALIBRATE.value)
 
-        # TODO read calibration from a file or something
-        # travelable distance steps
-        msg += self.__encode_int(74810)
-
-        # steps per mm
-        msg += self.__encode_float(157.16)
-
-        # minAmplitudePos
-        msg += self.__encode_int(5809)
+        msg += self.__encode_int(TRAVELABLE_DISTANCE_STEPS)
+        msg += self.__encode_float(STEPS_PER_MM)
+        msg += self.__encode_int(MIN_AMPLITUDE_POS)
+        msg += self.__encode_int(MAX_AMPLITUDE_POS)
+        msg += self.__encode_int(MAX_ANGLE_POS)
+        msg += self.__encode_int(MAX_ENCODER_COUNT)
 
-        # maxAmplituePos
-        msg += self.__encode_int(80619)
-
-        # maxAnglePos
-        msg += self.__encode_int(28760)
-
-        # maxEncoderCount
-        msg += self.__encode_int(2450)
-
-        self.write_message(msg)
-        self.__wait_for_command_processing()
+        self.__send(msg, max_wait=ACK_TIMEOUT)
         return self.update_status()
 
     def add_position(self, amplitude, angle, pen, amplitude_velocity, angle_velocity):
@@ -282,37 +509,40 @@ class PolarSketcherInterface:
         # print("SENDING POS:", amplitude, angle, pen, amplitude_velocity, angle_velocity)
         # print("SENDING CHECKSUM VAL:", checksum)
         msg += self.__encode_int(checksum)
-        self.write_message(msg)
-
-        while not self.__wait_for_command_processing():
-            print("position not processed yet")
-            self.write_message(msg)
-
-        # this is un expected retry when the buffer
-        # on the controller side is full,
-        # for now just keep trying
-        while self.__needs_retry:
-            time.sleep(.1)
-            print("needs retry")
-            print(self.update_status())
-            self.write_message(msg)
-            self.__needs_retry = False
-            # TODO if the command is not being processed at all
-            # the controller has to be reset
-            while not self.__wait_for_command_processing():
-                print("position not processed yet")
+        with self.__in_flight_changed:
+            self.__wait_for_position_credits()
+            self.__send(msg, n_positions=1)
+
+    def add_positions(self, positions: np.ndarray):
+        """
+        sends positions, rows of (amplitude, angle, pen, amplitude velocity, angle velocity),
+        with up to MAX_POSITIONS_PER_BATCH of them in each command and acknowledgement.
+        every batch is cut to the free slots of the controller, so it is never refused for a full buffer
+        """
+        positions = np.asarray(positions, dtype=np.int64).reshape((-1, 5))
+        start = 0
+        while start < len(positions):
+            with self.__in_flight_changed:
+                batch_size = min(MAX_POSITIONS_PER_BATCH, self.__wait_for_position_credits())
+                batch = positions[start:start + batch_size]
+                msg = self.__encode_int(Command.ADD_POSITIONS.value)
+                msg += self.__encode_int(len(batch))
+                msg += batch.astype("<i4").tobytes()
+                # same checksum as a single position, summed over the batch.
+                # fmod keeps the sign of the value like the % of the firmware
+                msg += self.__encode_int(int(np.fmod(batch, 123).sum()))
+                self.__send(msg, n_positions=len(batch))
+            start += len(batch)
 
     def update_status(self) -> Status:
         msg = self.__encode_int(Command.GET_STATUS.value)
-        self.write_message(msg)
-        self.__wait_for_command_processing()
+        self.__send(msg, max_wait=ACK_TIMEOUT)
         return self.status
 
     def set_angle_correction(self, value: bool) -> Status:
         msg = self.__encode_int(Command.SET_ANGLE_CORRECTION.value)
         msg += self.__encode_int(int(value))
-        self.write_message(msg)
-        self.__wait_for_command_processing()
+        self.__send(msg, max_wait=ACK_TIMEOUT)
         return self.update_status()
 
     def wait_for_idle(self) -> Status:
@@ -322,17 +552,41 @@ class PolarSketcherInterface:
         return self.status
 
     def convert_to_stepper_positions(self, canvas_size: Tuple[float, float], position: Tuple[float, float]) -> Tuple[int, int]:
-        polar_coords = polar(complex(position[0], position[1]))
-        amplitude = polar_coords[0]
-        angle = polar_coords[1] * (180 / pi)
-        canvas_amplitude = canvas_size[0]
-
-        amplitudeSteps = mapMinMax(
-            amplitude,
-            0, canvas_amplitude,
-            0, self.status.maxAmplituePos)
-        angleSteps = mapMinMax(angle, 0, 90, 0, self.status.maxAnglePos)
-        return int(amplitudeSteps), int(angleSteps)
+        return convert_to_stepper_positions(canvas_size,
+                                            position,
+                                            self.status.maxAmplituePos,
+                                            self.status.maxAnglePos)
+
+
+def convert_to_stepper_positions(canvas_size: Tuple[float, float],
+                                 position: Tuple[float, float],
+                                 max_amplitude_pos=MAX_AMPLITUDE_POS,
+                                 max_angle_pos=MAX_ANGLE_POS) -> Tuple[int, int]:
+    polar_coords = polar(complex(position[0], position[1]))
+    amplitude = polar_coords[0]
+    angle = polar_coords[1] * (180 / pi)
+    canvas_amplitude = canvas_size[0]
+
+    amplitudeSteps = mapMinMax(
+        amplitude,
+        0, canvas_amplitude,
+        0, max_amplitude_pos)
+    angleSteps = mapMinMax(angle, 0, 90, 0, max_angle_pos)
+    return int(amplitudeSteps), int(angleSteps)
+
+
+def stepper_positions(canvas_size: Tuple[float, float],
+                      positions: np.ndarray,
+                      max_amplitude_pos=MAX_AMPLITUDE_POS,
+                      max_angle_pos=MAX_ANGLE_POS) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    convert_to_stepper_positions for an array of positions (complex numbers),
+    the steps are not rounded
+    """
+    amplitude = np.abs(positions)
+    angle = np.degrees(np.angle(positions))
+    return (mapMinMax(amplitude, 0, canvas_size[0], 0, max_amplitude_pos),
+            mapMinMax(angle, 0, 90, 0, max_angle_pos))
 
 
 def mapMinMax(srcVal, srcMin, srcMax, targetMin, targetMax):
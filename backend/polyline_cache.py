@@ -0,0 +1,132 @@
+import hashlib
+import json
+import os
+import struct
+from tempfile import NamedTemporaryFile
+from threading import Lock
+from typing import List, Tuple, Optional
+
+import numpy as np
+
+# file layout (little endian):
+#   header:  magic, version, number of paths, number of points
+#   offsets: int64[n_paths + 1], start of every path in the points array
+#   closed:  uint8[n_paths]
+#   points:  float64[n_points, 2]
+_MAGIC = b'PSPL'
+_VERSION = 1
+_HEADER = struct.Struct("<4sIQQ")
+_FILE_EXTENSION = ".polylines"
+
+
+def polyline_cache_key(svg: str, settings: dict) -> str:
+    """
+    content address for a drawing, settings has to contain everything
+    that influences the generated points (sizes, scale, rotation, algorithms...)
+    """
+    digest = hashlib.sha256()
+    digest.update(svg.encode("utf-8"))
+    digest.update(json.dumps(settings, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def encode_polylines(polylines: List[Tuple[np.ndarray, bool]]) -> bytes:
+    offsets = np.zeros(len(polylines) + 1, dtype="<i8")
+    offsets[1:] = np.cumsum([len(points) for points, _ in polylines])
+    closed = np.array([closed for _, closed in polylines], dtype=np.uint8)
+    points = np.concatenate([points for points, _ in polylines]) if len(polylines) > 0 else np.empty((0, 2))
+
+    header = _HEADER.pack(_MAGIC, _VERSION, len(polylines), int(offsets[-1]))
+    return header + offsets.tobytes() + closed.tobytes() + points.astype("<f8").tobytes()
+
+
+def decode_polylines(data: bytes) -> List[Tuple[np.ndarray, bool]]:
+    magic, version, n_paths, n_points = _HEADER.unpack_from(data)
+    if magic != _MAGIC or version != _VERSION:
+        raise ValueError("not a polyline cache file")
+
+    read_idx = _HEADER.size
+    offsets = np.frombuffer(data, dtype="<i8", count=n_paths + 1, offset=read_idx)
+    read_idx += offsets.nbytes
+    closed = np.frombuffer(data, dtype=np.uint8, count=n_paths, offset=read_idx)
+    read_idx += closed.nbytes
+    points = np.frombuffer(data, dtype="<f8", count=n_points * 2, offset=read_idx).reshape((n_points, 2))
+
+    return [(points[offsets[i]:offsets[i + 1]], bool(closed[i])) for i in range(n_paths)]
+
+
+class PolylineCache:
+    """
+    on disk cache of flattened drawings, evicts the least recently
+    used entries once the directory grows over max_size_bytes
+    """
+
+    def __init__(self, directory: str, max_size_bytes: int):
+        self.directory = directory
+        self.max_size_bytes = max_size_bytes
+        self._lock = Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + _FILE_EXTENSION)
+
+    def get(self, key: str) -> Optional[List[Tuple[np.ndarray, bool]]]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            # the modification time doubles as the last access time for the eviction
+            os.utime(path)
+            return decode_polylines(data)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print("dropping unreadable cache entry %s:" % key, e)
+            self._remove(path)
+            return None
+
+    def put(self, key: str, polylines: List[Tuple[np.ndarray, bool]]):
+        data = encode_polylines(polylines)
+        if len(data) > self.max_size_bytes:
+            return
+
+        # write to a temporary file first so readers never see half written entries
+        temporary_path = None
+        try:
+            with NamedTemporaryFile("wb", dir=self.directory, delete=False) as f:
+                temporary_path = f.name
+                f.write(data)
+            os.replace(temporary_path, self._path(key))
+        except OSError as e:
+            print("failed to store cache entry %s:" % key, e)
+            # it isn't an entry, eviction would never remove it
+            if temporary_path is not None:
+                self._remove(temporary_path)
+            return
+
+        self._evict()
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.directory):
+                if not name.endswith(_FILE_EXTENSION):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+
+            total_size = sum(size for _, size, _ in entries)
+            for _, size, name in sorted(entries):
+                if total_size <= self.max_size_bytes:
+                    break
+                self._remove(os.path.join(self.directory, name))
+                total_size -= size
+
+    def _remove(self, path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -1,15 +1,22 @@
-from typing import Tuple, List
+from typing import Tuple, List, Generator, Callable
 
 import math
+import numpy as np
 from svgelements import Circle
 from svgpathtools import Path
 
+from path_sampler import path_points, segment_ends
+from spatial_grid import PointGrid, BoxGrid
+
 
 class ClosedPath:
     def __init__(self, path: Path, new_start: float = 0):
         self.path = path
         self.new_start = new_start
 
+    def __len__(self):
+        return len(self.path)
+
     def point(self, point: float):
         return self.path.point(math.fmod(point + self.new_start, 1))
 
@@ -19,8 +26,37 @@ class ClosedPath:
     def bbox(self):
         return self.path.bbox()
 
+    def isclosed(self):
+        return self.path.isclosed()
+
+    def isclosedac(self):
+        return self.path.isclosedac()
+
+    def reversed(self):
+        return ClosedPath(self.path.reversed(), math.fmod(1 - self.new_start, 1))
+
     def rotated(self, rotation, origin):
-        return self.path.rotated(rotation, origin)
+        # the sampler works on the rotated path, so it has to start at new_start as well
+        return restart_closed_path(self.path, self.new_start).rotated(rotation, origin)
+
+
+def restart_closed_path(path: Path, T: float) -> Path:
+    """
+    returns a path with the same segments as the closed path
+    that starts (and ends) at path.point(T)
+    """
+    if T <= 0 or T >= 1:
+        return path
+
+    seg_idx, t = path.T2t(T)
+    segments = list(path)
+    if t <= 0:
+        return Path(*(segments[seg_idx:] + segments[:seg_idx]))
+    if t >= 1:
+        return Path(*(segments[seg_idx + 1:] + segments[:seg_idx + 1]))
+
+    first_part, second_part = segments[seg_idx].split(t)
+    return Path(*([second_part] + segments[seg_idx + 1:] + segments[:seg_idx] + [first_part]))
 
 
 def calc_distance(a: complex, b: complex) -> float:
@@ -214,6 +250,211 @@ def sort_paths(start_point: complex,
         last_point = path.point(1)
 
 
+def sort_paths_with_index(start_point: complex,
+                          paths: list[Path],
+                          canvas_size: Tuple[float, float],
+                          allow_reverse=False) -> Generator[Path, None, None]:
+    """
+    same order as sort_paths with find_closest_path (or find_closest_path_with_endpoint
+    if allow_reverse is set) but the path endpoints are only evaluated once and
+    looked up in a grid, instead of checking every remaining path on every step
+    """
+    if len(paths) == 0:
+        return
+
+    # one entry per path start, with allow_reverse the path ends follow right after
+    entries_per_path = 2 if allow_reverse else 1
+    entry_points = np.empty(len(paths) * entries_per_path, dtype=complex)
+    entry_points[::entries_per_path] = [p.point(0) for p in paths]
+    if allow_reverse:
+        entry_points[1::2] = [p.point(1) for p in paths]
+
+    grid = PointGrid(entry_points)
+    last_point = start_point
+    for _ in range(len(paths)):
+        entry_idx, _ = grid.nearest(last_point)
+        path_idx = entry_idx // entries_per_path
+        for idx in range(path_idx * entries_per_path, (path_idx + 1) * entries_per_path):
+            grid.remove(idx)
+
+        path = paths[path_idx]
+        if entry_idx % entries_per_path == 1:
+            path = path.reversed()
+
+        yield path
+        last_point = path.point(1)
+
+
+def sort_paths_by_move_time(start_point: complex,
+                            paths: list[Path],
+                            canvas_size: Tuple[float, float],
+                            to_stepper: Callable[[np.ndarray], Tuple[np.ndarray, np.ndarray]],
+                            amplitude_velocity: float,
+                            angle_velocity: float,
+                            allow_reverse=True) -> Generator[Path, None, None]:
+    """
+    greedy closest path sorting where the distance is the time the steppers
+    need for the pen up move, both axes move at the same time so that is
+    max(|d amplitude| / amplitude_velocity, |d angle| / angle_velocity),
+    to_stepper maps an array of path points to (amplitude, angle) steps
+    """
+    if len(paths) == 0:
+        return
+
+    entries_per_path = 2 if allow_reverse else 1
+    starts = np.array([p.point(0) for p in paths], dtype=complex)
+    ends = np.array([p.point(1) for p in paths], dtype=complex)
+
+    def _move_time_space(points: np.ndarray) -> np.ndarray:
+        # scaled so that the chebyshev distance is the move time
+        amplitude, angle = to_stepper(points)
+        return amplitude / amplitude_velocity + 1j * (angle / angle_velocity)
+
+    start_positions = _move_time_space(starts)
+    end_positions = _move_time_space(ends)
+    entry_positions = np.empty(len(paths) * entries_per_path, dtype=complex)
+    exit_positions = np.empty(len(paths) * entries_per_path, dtype=complex)
+    entry_positions[::entries_per_path] = start_positions
+    exit_positions[::entries_per_path] = end_positions
+    if allow_reverse:
+        entry_positions[1::2] = end_positions
+        exit_positions[1::2] = start_positions
+
+    grid = PointGrid(entry_positions, metric="chebyshev")
+    last_position = _move_time_space(np.array([start_point], dtype=complex))[0]
+    for _ in range(len(paths)):
+        entry_idx, _ = grid.nearest(last_position)
+        path_idx = entry_idx // entries_per_path
+        for idx in range(path_idx * entries_per_path, (path_idx + 1) * entries_per_path):
+            grid.remove(idx)
+
+        path = paths[path_idx]
+        if entry_idx % entries_per_path == 1:
+            path = path.reversed()
+
+        yield path
+        last_position = exit_positions[entry_idx]
+
+
+def _flatten_closed_path(path: Path, flatten_step: float) -> Tuple[np.ndarray, np.ndarray]:
+    try:
+        n_edges = max(8, math.ceil(path.length() / flatten_step))
+    except ZeroDivisionError:
+        n_edges = 1
+    # the segment boundaries are vertices as well, so every edge lies on a single
+    # segment and interpolating T along an edge stays close to the edge
+    T = np.union1d(np.arange(n_edges + 1) / n_edges, np.clip(segment_ends(path), 0, 1))
+    return path_points(path, T), T
+
+
+def sort_paths_with_closed_path_entries(start_point: complex,
+                                        paths: list[Path],
+                                        canvas_size: Tuple[float, float],
+                                        flatten_step=1.0) -> Generator[Path, None, None]:
+    """
+    greedy closest path sorting where closed paths are entered at their closest
+    point and open paths at their closest end (reversing them if needed),
+    closed paths are flattened once into vertices about flatten_step apart and
+    all vertices share one grid with the open path ends, the entry point is
+    then the projection onto the polyline edges around the closest vertices
+    """
+    if len(paths) == 0:
+        return
+
+    vertex_batches = []
+    T_batches = []
+    # a closed path without length (a lone point) has no edges to flatten, it is entered at its start
+    closed = np.array([p.isclosed() and p.length() > 0 for p in paths], dtype=bool)
+    for p, is_closed in zip(paths, closed.tolist()):
+        if is_closed:
+            vertices, T = _flatten_closed_path(p, flatten_step)
+        elif p.isclosed():
+            vertices, T = np.array([p.start], dtype=complex), np.array([0.0])
+        else:
+            vertices, T = np.array([p.point(0), p.point(1)], dtype=complex), np.array([0.0, 1.0])
+        vertex_batches.append(vertices)
+        T_batches.append(T)
+
+    # vertices of path i are vertices[path_start[i]:path_start[i + 1]]
+    path_start = np.zeros(len(paths) + 1, dtype=np.int64)
+    path_start[1:] = np.cumsum([len(vertices) for vertices in vertex_batches])
+    vertices = np.concatenate(vertex_batches)
+    vertex_T = np.concatenate(T_batches)
+    vertex_path = np.repeat(np.arange(len(paths)), np.diff(path_start))
+
+    # an edge goes from vertex i to i + 1, only closed paths have edges
+    has_edge = np.zeros(len(vertices), dtype=bool)
+    has_edge[:-1] = (vertex_path[:-1] == vertex_path[1:]) & closed[vertex_path[:-1]]
+    edge_lengths = np.abs(vertices[1:] - vertices[:-1])[has_edge[:-1]]
+    max_edge_length = float(edge_lengths.max()) if len(edge_lengths) > 0 else 0.0
+
+    grid = PointGrid(vertices)
+    last_point = start_point
+    for _ in range(len(paths)):
+        vertex_idx, distance = grid.nearest(last_point)
+        path_idx = int(vertex_path[vertex_idx])
+        entry_T = float(vertex_T[vertex_idx])
+
+        # a closer edge point has an edge end that is at most half an edge further away than it
+        if max_edge_length > 0:
+            nearby = grid.within(last_point, distance + max_edge_length / 2)
+            edges = np.unique(np.concatenate([nearby[has_edge[nearby]],
+                                              nearby[has_edge[np.maximum(nearby - 1, 0)] & (nearby > 0)] - 1]))
+            if len(edges) > 0:
+                edge_starts = vertices[edges]
+                edge_directions = vertices[edges + 1] - edge_starts
+                edge_length_sq = edge_directions.real ** 2 + edge_directions.imag ** 2
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    t = ((last_point - edge_starts) * np.conj(edge_directions)).real / edge_length_sq
+                t = np.clip(np.nan_to_num(t), 0, 1)
+                edge_distances = np.abs(edge_starts + t * edge_directions - last_point)
+                closest_edge = int(np.argmin(edge_distances))
+                if edge_distances[closest_edge] < distance:
+                    edge = edges[closest_edge]
+                    path_idx = int(vertex_path[edge])
+                    entry_T = float(vertex_T[edge] + t[closest_edge] * (vertex_T[edge + 1] - vertex_T[edge]))
+
+        grid.remove_all(np.arange(path_start[path_idx], path_start[path_idx + 1]))
+
+        path = paths[path_idx]
+        if closed[path_idx]:
+            path = restart_closed_path(path, entry_T)
+        elif entry_T == 1.0:
+            path = path.reversed()
+
+        yield path
+        last_point = path.point(1)
+
+
+def sort_paths_with_radar_scan(start_point: complex,
+                               paths: list[Path],
+                               canvas_size: Tuple[float, float],
+                               radar_step=2) -> Generator[Path, None, None]:
+    """
+    same idea as find_closest_path_with_radar_scan, a circle around the last point grows in
+    radar_step increments until it touches the bbox of a path, the first path in the list that
+    is touched is next. the bboxes are looked up in a grid instead of testing sampled circle
+    points against every path, so small bboxes are never skipped and there always is a result
+    """
+    if len(paths) == 0:
+        return
+
+    boxes = np.empty((len(paths), 4))
+    for i, p in enumerate(paths):
+        min_x, max_x, min_y, max_y = p.bbox()
+        boxes[i] = (min_x, min_y, max_x, max_y)
+
+    grid = BoxGrid(boxes)
+    last_point = start_point
+    for _ in range(len(paths)):
+        path_idx, _ = grid.nearest(last_point, distance_step=radar_step)
+        grid.remove(path_idx)
+
+        path = paths[path_idx]
+        yield path
+        last_point = path.point(1)
+
+
 SORTING_ALGORITHMS = {
     "none": None,
     "simple": find_closest_path,
@@ -0,0 +1,290 @@
+import math
+from typing import Tuple
+
+import numpy as np
+
+
+def _ring_cells(col: int, row: int, radius: int, n_cols: int, n_rows: int) -> np.ndarray:
+    """
+    cells of the square ring radius cells around (col, row) that are inside the grid
+    """
+    if radius == 0:
+        return np.array([row * n_cols + col])
+
+    cols = np.arange(col - radius, col + radius + 1)
+    rows = np.arange(row - radius + 1, row + radius)
+    ring_cols = np.concatenate([cols, cols,
+                                np.full(len(rows), col - radius), np.full(len(rows), col + radius)])
+    ring_rows = np.concatenate([np.full(len(cols), row - radius), np.full(len(cols), row + radius),
+                                rows, rows])
+    inside = (ring_cols >= 0) & (ring_cols < n_cols) & (ring_rows >= 0) & (ring_rows < n_rows)
+    return ring_rows[inside] * n_cols + ring_cols[inside]
+
+
+class PointGrid:
+    """
+    uniform grid over a fixed set of points (complex numbers) that supports
+    removing points and nearest neighbour queries, the cells are searched
+    in rings around the query point until no closer point can exist,
+    metric is either "euclidean" or "chebyshev" (max of the axis distances)
+    """
+
+    def __init__(self, points: np.ndarray, points_per_cell=4, metric="euclidean"):
+        if metric not in ("euclidean", "chebyshev"):
+            raise ValueError("unknown metric %s" % metric)
+
+        self.points = np.asarray(points, dtype=complex)
+        self.metric = metric
+        self.alive = np.ones(len(self.points), dtype=bool)
+        self.n_alive = len(self.points)
+        self.points_per_cell = points_per_cell
+        self._build(np.arange(len(self.points)))
+
+    def _build(self, idxs: np.ndarray):
+        points = self.points[idxs]
+        self._n_built = len(idxs)
+        if len(idxs) == 0:
+            self.min_x = self.min_y = 0.0
+            self.cell_size = 1.0
+            self.cols = self.rows = 1
+            self.cell_start = np.zeros(2, dtype=np.int64)
+            self.cell_points = idxs
+            self.cell_alive = np.zeros(1, dtype=np.int64)
+            return
+
+        self.min_x = float(points.real.min())
+        self.min_y = float(points.imag.min())
+        width = float(points.real.max()) - self.min_x
+        height = float(points.imag.max()) - self.min_y
+        area = max(width * height, 1e-12)
+        self.cell_size = max(math.sqrt(area * self.points_per_cell / len(idxs)), max(width, height) / 1024, 1e-9)
+        self.cols = int(width / self.cell_size) + 1
+        self.rows = int(height / self.cell_size) + 1
+
+        cells = self._cell_of(points.real, points.imag)
+        order = np.argsort(cells, kind="stable")
+        # cell c holds cell_points[cell_start[c]:cell_start[c + 1]]
+        self.cell_points = idxs[order]
+        self.cell_start = np.searchsorted(cells[order], np.arange(self.cols * self.rows + 1))
+        self.cell_alive = np.diff(self.cell_start)
+
+    def _cell_coords(self, x, y):
+        col = np.clip(((x - self.min_x) / self.cell_size).astype(np.int64), 0, self.cols - 1)
+        row = np.clip(((y - self.min_y) / self.cell_size).astype(np.int64), 0, self.rows - 1)
+        return col, row
+
+    def _cell_of(self, x, y):
+        col, row = self._cell_coords(x, y)
+        return row * self.cols + col
+
+    def remove(self, idx: int):
+        if not self.alive[idx]:
+            return
+
+        self.alive[idx] = False
+        self.n_alive -= 1
+        point = self.points[idx]
+        self.cell_alive[int(self._cell_of(np.array(point.real), np.array(point.imag)))] -= 1
+
+        # once most of the points are gone the rings get too sparse, rebuild over the remaining ones
+        if self.n_alive > 0 and self.n_alive < self._n_built // 4:
+            self._build(np.flatnonzero(self.alive))
+
+    def remove_all(self, idxs: np.ndarray):
+        """
+        vectorized remove for many points at once
+        """
+        idxs = np.asarray(idxs, dtype=np.int64)
+        idxs = idxs[self.alive[idxs]]
+        if len(idxs) == 0:
+            return
+
+        self.alive[idxs] = False
+        self.n_alive -= len(idxs)
+        points = self.points[idxs]
+        np.subtract.at(self.cell_alive, self._cell_of(points.real, points.imag), 1)
+
+        if self.n_alive > 0 and self.n_alive < self._n_built // 4:
+            self._build(np.flatnonzero(self.alive))
+
+    def _distances(self, point: complex, idxs: np.ndarray) -> np.ndarray:
+        diff = self.points[idxs] - point
+        if self.metric == "chebyshev":
+            return np.maximum(np.abs(diff.real), np.abs(diff.imag))
+        return np.sqrt(diff.real * diff.real + diff.imag * diff.imag)
+
+    def within(self, point: complex, radius: float) -> np.ndarray:
+        """
+        returns the indexes of all points that were not removed yet and
+        are at most radius away from point
+        """
+        min_col, min_row = self._cell_coords(np.array(point.real - radius), np.array(point.imag - radius))
+        max_col, max_row = self._cell_coords(np.array(point.real + radius), np.array(point.imag + radius))
+        cols = np.arange(int(min_col), int(max_col) + 1)
+        rows = np.arange(int(min_row), int(max_row) + 1)
+        cells = (rows[:, None] * self.cols + cols[None, :]).ravel()
+        cells = cells[self.cell_alive[cells] > 0]
+        if len(cells) == 0:
+            return np.empty(0, dtype=np.int64)
+
+        candidates = np.concatenate([self.cell_points[self.cell_start[c]:self.cell_start[c + 1]]
+                                     for c in cells.tolist()])
+        candidates = candidates[self.alive[candidates]]
+        return candidates[self._distances(point, candidates) <= radius]
+
+    def nearest(self, point: complex) -> Tuple[int, float]:
+        """
+        returns the index and distance of the closest point that was not removed yet,
+        on equal distances the lowest index wins
+        """
+        if self.n_alive == 0:
+            raise ValueError("grid is empty")
+
+        col, row = self._cell_coords(np.array(point.real), np.array(point.imag))
+        col, row = int(col), int(row)
+        max_radius = max(col, self.cols - 1 - col, row, self.rows - 1 - row)
+
+        best_idx = -1
+        best_distance = math.inf
+        for radius in range(max_radius + 1):
+            # the points of this ring are at least radius - 1 cells away along one axis
+            if best_distance < (radius - 1) * self.cell_size:
+                break
+
+            cells = _ring_cells(col, row, radius, self.cols, self.rows)
+            cells = cells[self.cell_alive[cells] > 0]
+            if len(cells) == 0:
+                continue
+
+            candidates = np.concatenate([self.cell_points[self.cell_start[c]:self.cell_start[c + 1]]
+                                         for c in cells.tolist()])
+            candidates = candidates[self.alive[candidates]]
+            distances = self._distances(point, candidates)
+            closest = distances.min()
+            candidate_idx = int(candidates[distances == closest].min())
+            if closest < best_distance or (closest == best_distance and candidate_idx < best_idx):
+                best_distance = float(closest)
+                best_idx = candidate_idx
+
+        return best_idx, best_distance
+
+
+class BoxGrid:
+    """
+    uniform grid over a fixed set of axis aligned boxes (min_x, min_y, max_x, max_y),
+    every box is stored in all cells it overlaps, supports removing boxes and
+    searching outwards from a point in rings of cells.
+    boxes overlapping more than max_box_cells cells would be copied into too many of them
+    (nested outlines are all about as big as the drawing), they are kept in a separate
+    list instead that is checked on every query
+    """
+
+    def __init__(self, boxes: np.ndarray, boxes_per_cell=2, max_box_cells=64):
+        self.boxes = np.asarray(boxes, dtype=float).reshape((-1, 4))
+        self.alive = np.ones(len(self.boxes), dtype=bool)
+        self.n_alive = len(self.boxes)
+
+        if len(self.boxes) == 0:
+            self.min_x = self.min_y = 0.0
+            self.cell_size = 1.0
+            self.cols = self.rows = 1
+            self.cell_start = np.zeros(2, dtype=np.int64)
+            self.cell_boxes = np.empty(0, dtype=np.int64)
+            self.large_boxes = np.empty(0, dtype=np.int64)
+            return
+
+        self.min_x = float(self.boxes[:, 0].min())
+        self.min_y = float(self.boxes[:, 1].min())
+        width = float(self.boxes[:, 2].max()) - self.min_x
+        height = float(self.boxes[:, 3].max()) - self.min_y
+        area = max(width * height, 1e-12)
+        self.cell_size = max(math.sqrt(area * boxes_per_cell / len(self.boxes)), max(width, height) / 1024, 1e-9)
+        self.cols = int(width / self.cell_size) + 1
+        self.rows = int(height / self.cell_size) + 1
+
+        min_cols, min_rows = self._cell_coords(self.boxes[:, 0], self.boxes[:, 1])
+        max_cols, max_rows = self._cell_coords(self.boxes[:, 2], self.boxes[:, 3])
+        box_cols = max_cols - min_cols + 1
+        box_rows = max_rows - min_rows + 1
+        is_large = box_cols * box_rows > max_box_cells
+        self.large_boxes = np.flatnonzero(is_large)
+        small_boxes = np.flatnonzero(~is_large)
+        cells_per_box = box_cols[small_boxes] * box_rows[small_boxes]
+
+        # expand every small box into the cells it covers
+        box_idxs = np.repeat(small_boxes, cells_per_box)
+        offsets = np.arange(len(box_idxs)) - np.repeat(np.cumsum(cells_per_box) - cells_per_box, cells_per_box)
+        cols = min_cols[box_idxs] + offsets % box_cols[box_idxs]
+        rows = min_rows[box_idxs] + offsets // box_cols[box_idxs]
+        cells = rows * self.cols + cols
+
+        order = np.argsort(cells, kind="stable")
+        # cell c holds cell_boxes[cell_start[c]:cell_start[c + 1]]
+        self.cell_boxes = box_idxs[order]
+        self.cell_start = np.searchsorted(cells[order], np.arange(self.cols * self.rows + 1))
+
+    def _cell_coords(self, x, y):
+        col = np.clip(((np.asarray(x) - self.min_x) / self.cell_size).astype(np.int64), 0, self.cols - 1)
+        row = np.clip(((np.asarray(y) - self.min_y) / self.cell_size).astype(np.int64), 0, self.rows - 1)
+        return col, row
+
+    def remove(self, idx: int):
+        if self.alive[idx]:
+            self.alive[idx] = False
+            self.n_alive -= 1
+
+    def distances(self, point: complex, idxs: np.ndarray) -> np.ndarray:
+        """
+        distance from point to the boxes, 0 for boxes that contain the point
+        """
+        boxes = self.boxes[idxs]
+        dx = np.maximum(np.maximum(boxes[:, 0] - point.real, point.real - boxes[:, 2]), 0)
+        dy = np.maximum(np.maximum(boxes[:, 1] - point.imag, point.imag - boxes[:, 3]), 0)
+        return np.sqrt(dx * dx + dy * dy)
+
+    def nearest(self, point: complex, distance_step=0.0) -> Tuple[int, float]:
+        """
+        returns the index and distance of the closest box that was not removed yet,
+        with a distance_step the distances are rounded up to multiples of it first
+        (at least one step), on equal distances the lowest index wins
+        """
+        if self.n_alive == 0:
+            raise ValueError("grid is empty")
+
+        def _rounded(distances):
+            if distance_step <= 0:
+                return distances
+            return np.maximum(np.ceil(distances / distance_step), 1) * distance_step
+
+        col, row = self._cell_coords(point.real, point.imag)
+        col, row = int(col), int(row)
+        max_radius = max(col, self.cols - 1 - col, row, self.rows - 1 - row)
+
+        best_idx = -1
+        best_distance = math.inf
+        large_boxes = self.large_boxes[self.alive[self.large_boxes]]
+        if len(large_boxes) > 0:
+            distances = _rounded(self.distances(point, large_boxes))
+            best_distance = float(distances.min())
+            best_idx = int(large_boxes[distances == best_distance].min())
+
+        for radius in range(max_radius + 1):
+            # boxes that are not in the rings so far are at least radius - 1 cells away
+            if best_distance < _rounded(np.array((radius - 1) * self.cell_size)):
+                break
+
+            cells = _ring_cells(col, row, radius, self.cols, self.rows)
+            candidates = [self.cell_boxes[self.cell_start[c]:self.cell_start[c + 1]] for c in cells.tolist()]
+            candidates = np.concatenate(candidates) if len(candidates) > 0 else np.empty(0, dtype=np.int64)
+            candidates = candidates[self.alive[candidates]]
+            if len(candidates) == 0:
+                continue
+
+            distances = _rounded(self.distances(point, candidates))
+            closest = distances.min()
+            candidate_idx = int(candidates[distances == closest].min())
+            if closest < best_distance or (closest == best_distance and candidate_idx < best_idx):
+                best_distance = float(closest)
+                best_idx = candidate_idx
+
+        return best_idx, best_distance
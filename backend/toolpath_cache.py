@@ -0,0 +1,51 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import List, Optional
+
+from svgpathtools import Path
+
+# rough memory use of a parsed svgpathtools segment (object, points and attributes)
+_SEGMENT_SIZE_BYTES = 400
+
+
+def _estimated_size(paths: List[Path]) -> int:
+    return sum(len(path) + 1 for path in paths) * _SEGMENT_SIZE_BYTES
+
+
+class ToolpathCache:
+    """
+    in memory cache of parsed svgs and of the toolpaths generated from them, so changing
+    the toolpath angle or line step of a drawing doesn't parse it again and going back to
+    a previous setting doesn't regenerate it. evicts the least recently used entries once
+    their estimated size grows over max_size_bytes
+    """
+
+    def __init__(self, max_size_bytes: int):
+        self.max_size_bytes = max_size_bytes
+        self._entries = OrderedDict()
+        self._size_bytes = 0
+        self._lock = Lock()
+
+    def get(self, key: str) -> Optional[List[Path]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            # a copy, the cached list stays untouched by the caller
+            return list(entry[0])
+
+    def put(self, key: str, paths: List[Path]):
+        size = _estimated_size(paths)
+        if size > self.max_size_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._size_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (list(paths), size)
+            self._size_bytes += size
+
+            while self._size_bytes > self.max_size_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._size_bytes -= evicted_size
@@ -1,10 +1,11 @@
+from bisect import bisect_left
 from collections import defaultdict
-from typing import List, Tuple
+from typing import List, Tuple, Iterable
 
 from svgpathtools import Path, Line
 
 from path_quadtree import SegmentIntersection
-from .util import get_quadtree_height_intersections, get_brute_force_height_intersections
+from .util import IntersectionEngine, get_height_intersections_func
 
 
 class PathInConstruction:
@@ -39,46 +40,55 @@ def _continue_path(path_in_construction: PathInConstruction,
     return path_in_construction
 
 
-def _get_right_distance(path_in_construction: PathInConstruction,
-                        intersection: SegmentIntersection) -> float:
-    return abs(intersection.point_in_original_path - path_in_construction.point_in_path_to_follow)
-
-
-def _get_left_distance(path_in_construction: PathInConstruction,
-                       intersection: SegmentIntersection) -> float:
-    return abs(path_in_construction.point_in_path_to_follow - intersection.point_in_original_path)
-
-
-def _get_closest_intersection_pair(path_in_construction: PathInConstruction,
-                                   intersection_pairs: List[Tuple[SegmentIntersection,
-                                                                  SegmentIntersection]]
-                                   ) -> Tuple[Tuple[SegmentIntersection, SegmentIntersection], int, float]:
-    closest_intersection_pair_idx = -1
-    closest_intersection_pair = tuple()
-    distance_to_closest_intersection = 1
-    for idx, (left_intersection, right_intersection) in enumerate(intersection_pairs):
-        get_dist_func = _get_right_distance if path_in_construction.direction_right else _get_left_distance
-
-        if left_intersection.segment.original_path == path_in_construction.path_to_follow:
-            distance_to_left_intersection = get_dist_func(
-                path_in_construction, left_intersection)
-
-            if distance_to_left_intersection < distance_to_closest_intersection:
-                distance_to_closest_intersection = distance_to_left_intersection
-                closest_intersection_pair = (
-                    left_intersection, right_intersection)
-                closest_intersection_pair_idx = idx
-
-        if right_intersection.segment.original_path == path_in_construction.path_to_follow:
-            distance_to_right_intersection = get_dist_func(
-                path_in_construction, right_intersection)
-            if distance_to_right_intersection < distance_to_closest_intersection:
-                distance_to_closest_intersection = distance_to_right_intersection
-                closest_intersection_pair = (
-                    left_intersection, right_intersection)
-                closest_intersection_pair_idx = idx
-
-    return closest_intersection_pair, closest_intersection_pair_idx, distance_to_closest_intersection
+class _ContinuationIndex:
+    """
+    the intersections of a scanline grouped by the path they lie on
+    and sorted by their position in that path
+    """
+
+    def __init__(self, intersection_pairs: List[Tuple[SegmentIntersection, SegmentIntersection]]):
+        entries = defaultdict(list)
+        for idx, pair in enumerate(intersection_pairs):
+            for intersection in pair:
+                entries[id(intersection.segment.original_path)].append((intersection.point_in_original_path, idx))
+
+        self.points_in_path = {}
+        self.pair_idxs = {}
+        for path_key, path_entries in entries.items():
+            # sorting by (point, idx) puts the lowest pair idx first among equal points
+            path_entries.sort()
+            self.points_in_path[path_key] = [point for point, _ in path_entries]
+            self.pair_idxs[path_key] = [idx for _, idx in path_entries]
+
+    def closest_pair(self, path_in_construction: PathInConstruction) -> Tuple[int, float]:
+        """
+        idx of the pair with the intersection on the followed path closest to the followed point and
+        its distance, (-1, 1) if there is none closer than 1. ties go to the pair that comes first
+        """
+        path_key = id(path_in_construction.path_to_follow)
+        points = self.points_in_path.get(path_key)
+        if points is None:
+            return -1, 1
+
+        pair_idxs = self.pair_idxs[path_key]
+        point = path_in_construction.point_in_path_to_follow
+        closest_idx, closest_distance = -1, 1
+
+        # the first point at or after the followed point and the first of the points just before it
+        after = bisect_left(points, point)
+        candidates = []
+        if after < len(points):
+            candidates.append(after)
+        if after > 0:
+            candidates.append(bisect_left(points, points[after - 1]))
+
+        for candidate in candidates:
+            distance = abs(points[candidate] - point)
+            if distance < closest_distance or \
+                    (distance == closest_distance and closest_idx != -1 and pair_idxs[candidate] < closest_idx):
+                closest_idx, closest_distance = pair_idxs[candidate], distance
+
+        return closest_idx, closest_distance
 
 
 def _dispute_continuation(paths_in_construction: List[Tuple[PathInConstruction, float]]
@@ -102,12 +112,11 @@ def _continue_paths_in_construction(paths_in_construction: List[PathInConstructi
         Tuple[
             List[PathInConstruction],
             List[Tuple[SegmentIntersection, SegmentIntersection]]]:
+    continuation_index = _ContinuationIndex(intersection_pairs)
     intersection_pair_to_paths = defaultdict(list)
     finished_paths_in_construction = []
     for path_in_construction in paths_in_construction:
-        closest_continuation_pair, intersection_pair_idx, distance = \
-            _get_closest_intersection_pair(
-                path_in_construction, intersection_pairs)
+        intersection_pair_idx, distance = continuation_index.closest_pair(path_in_construction)
 
         # if a continuation for a path in construction has been found
         # that intersection pair needs to be removed from the candidates
@@ -123,15 +132,14 @@ def _continue_paths_in_construction(paths_in_construction: List[PathInConstructi
 
     # for all intersection_pairs where there is more than one path_in_construction to connect to
     # dispute which one will continue and which will have to be finished (currently the closest path wins)
-    intersection_pairs_to_remove = []
+    used_intersection_pair_idxs = set()
     for intersection_pair_idx, path_in_construction_list in intersection_pair_to_paths.items():
         path_to_continue, finished_paths = _dispute_continuation(
             path_in_construction_list)
         closest_continuation_pair = intersection_pairs[intersection_pair_idx]
 
         finished_paths_in_construction.extend(finished_paths)
-        intersection_pairs_to_remove.append(
-            intersection_pairs[intersection_pair_idx])
+        used_intersection_pair_idxs.add(intersection_pair_idx)
 
         connection_intersection = closest_continuation_pair[1] \
             if path_to_continue.direction_right else closest_continuation_pair[0]
@@ -143,30 +151,36 @@ def _continue_paths_in_construction(paths_in_construction: List[PathInConstructi
                        continuation_intersection,
                        zigzag=zigzag)
 
-    # cleanup used intersection pairs
-    for intersection_pair in intersection_pairs_to_remove:
-        intersection_pairs.remove(intersection_pair)
-
     # returns the finished paths ready to be yielded and
     # the remaining intersection pairs for new paths
-    return finished_paths_in_construction, intersection_pairs
+    remaining_intersection_pairs = [intersection_pair for idx, intersection_pair in enumerate(intersection_pairs)
+                                    if idx not in used_intersection_pair_idxs]
+    return finished_paths_in_construction, remaining_intersection_pairs
 
 
 def connecting_lines(paths: list[Path],
                      canvas_dimensions: Tuple[int, int],
                      line_step=10, angle=0,
-                     use_quadtree=True,
-                     zigzag=True):
-    get_height_intersection_func = get_quadtree_height_intersections \
-        if use_quadtree else get_brute_force_height_intersections
+                     intersection_engine=IntersectionEngine.SCANLINE,
+                     zigzag=True,
+                     workers=0):
+    get_height_intersection_func = get_height_intersections_func(intersection_engine, workers)
     height_intersections = get_height_intersection_func(paths,
                                                         canvas_dimensions,
                                                         line_step, angle)
+    return connect_height_intersections(height_intersections, zigzag=zigzag)
+
 
+def connect_height_intersections(height_intersections: Iterable[Tuple[float, List[SegmentIntersection]]],
+                                 zigzag=True):
+    """
+    joins the hatch lines of the (height, intersections) of an intersection engine
+    into paths that follow the crossed paths from one line to the next
+    """
     paths_in_construction = []
-    for height in sorted(height_intersections.keys()):
+    for _height, intersections in height_intersections:
         sorted_height_intersections = sorted(
-            height_intersections[height], key=lambda x: x.intersection_point.real)
+            intersections, key=lambda x: x.intersection_point.real)
 
         # HACK: duplicate initial intersection if it hits a vertice
         if len(sorted_height_intersections) == 1:
@@ -188,7 +202,9 @@ def connecting_lines(paths: list[Path],
         # yield the finished paths
         for path_in_construction in finished_paths_in_construction:
             yield path_in_construction.path
-            paths_in_construction.remove(path_in_construction)
+        finished_ids = {id(path_in_construction) for path_in_construction in finished_paths_in_construction}
+        paths_in_construction = [path_in_construction for path_in_construction in paths_in_construction
+                                 if id(path_in_construction) not in finished_ids]
 
         for left, right in remaining_intersection_pairs:
             new_path = Path(Line(left.intersection_point,
@@ -209,13 +225,17 @@ def rect_lines(paths: list[Path],
                canvas_dimensions: Tuple[int, int],
                line_step=10,
                angle=0,
-               use_quadtree=True):
-    return connecting_lines(paths, canvas_dimensions, line_step, angle, use_quadtree, zigzag=False)
+               intersection_engine=IntersectionEngine.SCANLINE,
+               workers=0):
+    return connecting_lines(paths, canvas_dimensions, line_step, angle, intersection_engine,
+                            zigzag=False, workers=workers)
 
 
 def zigzag_lines(paths: list[Path],
                  canvas_dimensions: Tuple[int, int],
                  line_step=10,
                  angle=0,
-                 use_quadtree=True):
-    return connecting_lines(paths, canvas_dimensions, line_step, angle, use_quadtree, zigzag=True)
+                 intersection_engine=IntersectionEngine.SCANLINE,
+                 workers=0):
+    return connecting_lines(paths, canvas_dimensions, line_step, angle, intersection_engine,
+                            zigzag=True, workers=workers)
@@ -0,0 +1,42 @@
+from typing import List, Tuple
+
+from svgpathtools import Path
+
+from .connecting_lines import connect_height_intersections
+from .scanline import ScanlineEdges
+from .util import IntersectionEngine, get_height_intersections_func
+
+
+def crosshatch_lines(paths: List[Path],
+                     canvas_dimensions: Tuple[float, float],
+                     line_step=10,
+                     angle=0,
+                     intersection_engine=IntersectionEngine.SCANLINE,
+                     workers=0,
+                     passes=2):
+    """
+    zigzag fill in several passes, spread evenly over half a turn starting at angle
+    (2 passes cross at 90 degrees, 3 passes at 60 degrees).
+    with the scanline engine the segments are taken from the paths once and every pass
+    only rotates their arrays, the other engines index the rotated paths again for every pass.
+    like the other toolpaths the lines are returned rotated by angle, so every pass
+    is turned from its own angle back to that one
+    """
+    canvas_width, canvas_height = canvas_dimensions
+    canvas_center = complex(canvas_width / 2, canvas_height / 2)
+
+    if intersection_engine is IntersectionEngine.SCANLINE:
+        edges = ScanlineEdges(paths)
+
+        def _height_intersections(pass_angle):
+            return edges.height_intersections(canvas_dimensions, line_step, pass_angle, workers)
+    else:
+        get_height_intersections = get_height_intersections_func(intersection_engine, workers)
+
+        def _height_intersections(pass_angle):
+            return get_height_intersections(paths, canvas_dimensions, line_step, pass_angle)
+
+    for pass_idx in range(max(1, passes)):
+        pass_angle = angle + pass_idx * 180 / max(1, passes)
+        for path in connect_height_intersections(_height_intersections(pass_angle), zigzag=True):
+            yield path if pass_angle == angle else path.rotated(angle - pass_angle, canvas_center)
@@ -0,0 +1,134 @@
+import math
+from typing import Tuple
+
+import numpy as np
+from svgpathtools import Line, QuadraticBezier, CubicBezier, Arc
+
+# every segment is either a cubic polynomial in t (lines and beziers) or an elliptic arc
+POLYNOMIAL = 0
+ARC = 1
+
+
+def segment_coefficients(segment) -> Tuple[int, np.ndarray, float, float]:
+    """
+    returns (kind, coefficients, theta, delta) of a segment,
+    polynomials are P(t) = c0 + c1 t + c2 t^2 + c3 t^3,
+    arcs are P(t) = c0 + c1 cos(a) + c2 sin(a) with a = theta + t * delta (radians)
+    """
+    coefficients = np.zeros(4, dtype=complex)
+    if isinstance(segment, Line):
+        coefficients[:2] = segment.start, segment.end - segment.start
+    elif isinstance(segment, QuadraticBezier):
+        start, control, end = segment.bpoints()
+        coefficients[:3] = start, 2 * (control - start), start - 2 * control + end
+    elif isinstance(segment, CubicBezier):
+        start, control1, control2, end = segment.bpoints()
+        coefficients[:] = (start,
+                           3 * (control1 - start),
+                           3 * (start + control2) - 6 * control1,
+                           -start + 3 * (control1 - control2) + end)
+    elif isinstance(segment, Arc):
+        coefficients[:3] = (segment.center,
+                            segment.radius.real * segment.rot_matrix,
+                            1j * segment.radius.imag * segment.rot_matrix)
+        return ARC, coefficients, math.radians(segment.theta), math.radians(segment.delta)
+    else:
+        raise ValueError("unsupported segment type %s" % type(segment).__name__)
+
+    return POLYNOMIAL, coefficients, 0.0, 0.0
+
+
+def evaluate(kinds: np.ndarray,
+             coefficients: np.ndarray,
+             thetas: np.ndarray,
+             deltas: np.ndarray,
+             t: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    points and derivatives (by t) for a batch of segments, one t per segment
+    """
+    c0, c1, c2, c3 = coefficients.T
+    polynomial_points = c0 + t * (c1 + t * (c2 + t * c3))
+    polynomial_derivatives = c1 + t * (2 * c2 + 3 * t * c3)
+
+    angles = thetas + t * deltas
+    cos_angles, sin_angles = np.cos(angles), np.sin(angles)
+    arc_points = c0 + c1 * cos_angles + c2 * sin_angles
+    arc_derivatives = deltas * (c2 * cos_angles - c1 * sin_angles)
+
+    is_arc = kinds == ARC
+    return np.where(is_arc, arc_points, polynomial_points), np.where(is_arc, arc_derivatives, polynomial_derivatives)
+
+
+def y_extrema(kind: int, coefficients: np.ndarray, theta: float, delta: float) -> np.ndarray:
+    """
+    sorted t in (0, 1) where y(t) turns, between them the segment is monotone in y
+    """
+    if kind == ARC:
+        # d/da (c1 cos(a) + c2 sin(a)).imag = 0
+        turn = math.atan2(coefficients[2].imag, coefficients[1].imag)
+        if delta == 0:
+            return np.empty(0)
+        first_k = math.floor((min(theta, theta + delta) - turn) / math.pi)
+        last_k = math.ceil((max(theta, theta + delta) - turn) / math.pi)
+        t = (turn + np.arange(first_k, last_k + 1) * math.pi - theta) / delta
+    else:
+        # y'(t) = c1 + 2 c2 t + 3 c3 t^2
+        a, b, c = 3 * coefficients[3].imag, 2 * coefficients[2].imag, coefficients[1].imag
+        if a == 0:
+            t = np.array([-c / b]) if b != 0 else np.empty(0)
+        else:
+            discriminant = b * b - 4 * a * c
+            if discriminant < 0:
+                return np.empty(0)
+            root = math.sqrt(discriminant)
+            t = np.array([(-b - root) / (2 * a), (-b + root) / (2 * a)])
+
+    return np.unique(t[(t > 0) & (t < 1)])
+
+
+def solve_heights(kinds: np.ndarray,
+                  coefficients: np.ndarray,
+                  thetas: np.ndarray,
+                  deltas: np.ndarray,
+                  t_low: np.ndarray,
+                  t_high: np.ndarray,
+                  y_low: np.ndarray,
+                  y_high: np.ndarray,
+                  heights: np.ndarray,
+                  max_iterations=64) -> np.ndarray:
+    """
+    batched y(t) = height for pieces that are monotone in y on [t_low, t_high] and
+    have the height between y_low = y(t_low) and y_high = y(t_high),
+    newton steps that stay inside the shrinking bracket, bisection otherwise
+    """
+    span = y_high - y_low
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = t_low + (t_high - t_low) * np.nan_to_num((heights - y_low) / span)
+    t = np.where(heights == y_low, t_low, np.where(heights == y_high, t_high, t))
+    increasing = span > 0
+    low, high = t_low.copy(), t_high.copy()
+    unsolved = (heights != y_low) & (heights != y_high)
+
+    for _ in range(max_iterations):
+        if not unsolved.any():
+            break
+
+        idxs = np.flatnonzero(unsolved)
+        points, derivatives = evaluate(kinds[idxs], coefficients[idxs], thetas[idxs], deltas[idxs], t[idxs])
+        error = points.imag - heights[idxs]
+
+        # the root is after t when the curve is still below the height going up (or above going down)
+        root_after = (error < 0) == increasing[idxs]
+        low[idxs] = np.where(root_after, t[idxs], low[idxs])
+        high[idxs] = np.where(root_after, high[idxs], t[idxs])
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            newton = t[idxs] - error / derivatives.imag
+        bisect = ~np.isfinite(newton) | (newton <= low[idxs]) | (newton >= high[idxs])
+        next_t = np.where(bisect, (low[idxs] + high[idxs]) / 2, newton)
+
+        converged = (error == 0) | (np.abs(next_t - t[idxs]) <= 1e-15) | (high[idxs] - low[idxs] <= 1e-15)
+        t[idxs] = np.where(error == 0, t[idxs], next_t)
+        unsolved[idxs[converged]] = False
+
+    return t
@@ -0,0 +1,34 @@
+import math
+from typing import List, Tuple
+
+import numpy as np
+from svgpathtools import Path
+
+
+def hatch_heights(y_min: float, y_max: float, canvas_height: float, line_step: int) -> List[int]:
+    """
+    the heights of the hatch grid (-2 * canvas_height to 2 * canvas_height in line_step steps)
+    that lie between y_min and y_max, the heights outside can't intersect anything
+    """
+    grid_start = -int(canvas_height) * 2
+    grid_end = int(canvas_height) * 2
+    if y_min > y_max:
+        return []
+
+    first_height = grid_start + max(0, math.ceil((y_min - grid_start) / line_step)) * line_step
+    return list(range(first_height, min(grid_end, math.floor(y_max) + 1), line_step))
+
+
+def path_y_ranges(paths: List[Path]) -> Tuple[np.ndarray, np.ndarray]:
+    y_ranges = np.array([path.bbox()[2:] for path in paths if len(path) > 0], dtype=float).reshape((-1, 2))
+    return y_ranges[:, 0], y_ranges[:, 1]
+
+
+def covered_heights(heights: List[int], y_mins: np.ndarray, y_maxs: np.ndarray) -> np.ndarray:
+    """
+    mask of the heights that lie in at least one of the y ranges, the others can be skipped
+    """
+    heights = np.asarray(heights, dtype=float)
+    started = np.searchsorted(np.sort(y_mins), heights, side="right")
+    ended = np.searchsorted(np.sort(y_maxs), heights, side="left")
+    return started > ended
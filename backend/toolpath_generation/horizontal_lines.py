@@ -1,23 +1,23 @@
 from typing import List, Tuple
 from svgpathtools import Path, Line
-from .util import get_quadtree_height_intersections, get_brute_force_height_intersections
+from .util import IntersectionEngine, get_height_intersections_func
 
 
 def horizontal_lines(paths: List[Path],
                      canvas_dimensions: Tuple[float, float],
                      line_step=10,
                      angle=0,
-                     use_quadtree=True):
-    get_height_intersection_func = get_quadtree_height_intersections \
-        if use_quadtree else get_brute_force_height_intersections
+                     intersection_engine=IntersectionEngine.SCANLINE,
+                     workers=0):
+    get_height_intersection_func = get_height_intersections_func(intersection_engine, workers)
     height_intersections = get_height_intersection_func(paths,
                                                         canvas_dimensions,
                                                         line_step, angle)
 
-    for height in sorted(height_intersections.keys()):
+    for _height, intersections in height_intersections:
         path = Path()
         curr_intersections = sorted(
-            height_intersections[height], key=lambda x: x.intersection_point.real)
+            intersections, key=lambda x: x.intersection_point.real)
         start = None
         for i in range(0, len(curr_intersections)):
             if i % 2 != 0:
@@ -0,0 +1,346 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+from typing import List, Tuple, Dict, Iterator
+
+import numpy as np
+from svgpathtools import Path, Line
+
+from path_quadtree import SegmentIntersection, PathSegment
+from path_sampler import segment_ends
+from .heights import hatch_heights
+from .curve_roots import POLYNOMIAL, ARC, segment_coefficients, y_extrema, evaluate, solve_heights
+
+# lines are crossed in closed form and don't need the root solver
+_LINE = -1
+
+
+class ScanlineEdges:
+    """
+    the segments of the paths as flat arrays of their ends and shapes (see curve_roots), taken from
+    the svgpathtools paths once. sweeping at an angle rotates these arrays instead of the paths, so
+    passes at several angles share them and the segment lengths of the paths
+    """
+
+    def __init__(self, paths: List[Path]):
+        self.paths = paths
+        self.segment_refs = []
+        kinds, coefficients, thetas, deltas, starts, ends = [], [], [], [], [], []
+        for path_idx, path in enumerate(paths):
+            for segment_idx, segment in enumerate(path):
+                kind, shape, theta, delta = segment_coefficients(segment)
+                self.segment_refs.append((path_idx, segment_idx))
+                kinds.append(_LINE if isinstance(segment, Line) else kind)
+                coefficients.append(shape)
+                thetas.append(theta)
+                deltas.append(delta)
+                starts.append(segment.start)
+                ends.append(segment.end)
+
+        self.kinds = np.array(kinds, dtype=np.int64)
+        self.coefficients = np.array(coefficients, dtype=complex).reshape((-1, 4))
+        self.thetas = np.array(thetas, dtype=float)
+        self.deltas = np.array(deltas, dtype=float)
+        self.starts = np.array(starts, dtype=complex)
+        self.ends = np.array(ends, dtype=complex)
+
+        # one PathSegment per crossed segment, like the quadtree returns them
+        self._path_segments = {}
+        self._path_segment_ends = {}
+
+    def height_intersections(self,
+                             canvas_dimensions: Tuple[float, float],
+                             line_step=10,
+                             angle=0,
+                             workers=0) -> Iterator[Tuple[float, List[SegmentIntersection]]]:
+        """
+        see iter_scanline_height_intersections. the intersection points are rotated by angle,
+        their segments and paths are the ones given (not rotated) and the same for every angle
+        """
+        canvas_width, canvas_height = canvas_dimensions
+        pieces = _MonotonePieces(self, angle, complex(canvas_width / 2, canvas_height / 2))
+        arrays = pieces.sweep_arrays()
+        heights = hatch_heights(arrays["y_min"].min(initial=np.inf),
+                                arrays["y_max"].max(initial=-np.inf),
+                                canvas_height, line_step)
+
+        if workers > 1 and len(heights) > 1:
+            batches = _sweep_in_process_pool(arrays, heights, workers)
+        else:
+            sweep = _Sweep(arrays)
+            batches = ((batch, sweep.crossings(batch)) for batch in _height_batches(heights))
+
+        for batch, (crossing_heights, segment_ids, xs, ts) in batches:
+            # the crossings are grouped by height in sweep order
+            height_ends = np.searchsorted(crossing_heights, batch, side="right").tolist()
+            crossings = list(zip(xs.tolist(), ts.tolist(), segment_ids.tolist()))
+            height_start = 0
+            for height, height_end in zip(batch, height_ends):
+                yield height, [self._intersection(height, x, t, segment_id)
+                               for x, t, segment_id in crossings[height_start:height_end]]
+                height_start = height_end
+
+    def _intersection(self, height: float, x: float, t: float, segment_id: int) -> SegmentIntersection:
+        path_idx, segment_idx = self.segment_refs[segment_id]
+        path = self.paths[path_idx]
+        path_segment = self._path_segments.get(segment_id)
+        if path_segment is None:
+            path_segment = PathSegment(path[segment_idx], original_path=path)
+            self._path_segments[segment_id] = path_segment
+
+        ends = self._path_segment_ends.get(path_idx)
+        if ends is None:
+            ends = segment_ends(path).tolist()
+            self._path_segment_ends[path_idx] = ends
+
+        # same as Path.t2T, without looking the segment up by equality
+        segment_start = ends[segment_idx - 1] if segment_idx > 0 else 0
+        point_in_original_path = (ends[segment_idx] - segment_start) * t + segment_start
+        return SegmentIntersection(complex(x, height), path_segment, t, point_in_original_path)
+
+
+class _MonotonePieces:
+    """
+    the segments of ScanlineEdges rotated by angle around origin and split into pieces that are
+    monotone in y, as flat arrays. piece i goes from t0 to t1 of segment segment_ids[i] with
+    y0 = y(t0) and y1 = y(t1), the shape of segment j is given by kinds[j], coefficients[j],
+    thetas[j] and deltas[j] (see curve_roots)
+    """
+
+    def __init__(self, edges: ScanlineEdges, angle: float, origin: complex):
+        # every coefficient is a point (c0) or a vector, so rotating them rotates the segment
+        rotation = np.exp(1j * np.radians(angle))
+        self.kinds = edges.kinds
+        self.thetas = edges.thetas
+        self.deltas = edges.deltas
+        self.coefficients = edges.coefficients * rotation
+        self.coefficients[:, 0] = (edges.coefficients[:, 0] - origin) * rotation + origin
+        starts = (edges.starts - origin) * rotation + origin
+        ends = (edges.ends - origin) * rotation + origin
+
+        # every segment is split at t = 0, 1 and where y turns
+        n_segments = len(self.kinds)
+        split_segments = [np.arange(n_segments), np.arange(n_segments)]
+        split_ts = [np.zeros(n_segments), np.ones(n_segments)]
+        turn_segments, turn_ts = self._y_turns()
+        split_segments.append(turn_segments)
+        split_ts.append(turn_ts)
+
+        split_segments = np.concatenate(split_segments)
+        split_ts = np.concatenate(split_ts)
+        order = np.lexsort((split_ts, split_segments))
+        split_segments, split_ts = split_segments[order], split_ts[order]
+        # a double root splits the segment only once
+        distinct = np.ones(len(split_ts), dtype=bool)
+        distinct[1:] = (split_segments[1:] != split_segments[:-1]) | (split_ts[1:] != split_ts[:-1])
+        split_segments, split_ts = split_segments[distinct], split_ts[distinct]
+
+        # the ends are the rotated ends of the segments,
+        # so consecutive segments share exactly the same vertex
+        points = np.empty(len(split_ts), dtype=complex)
+        is_start, is_end = split_ts == 0, split_ts == 1
+        points[is_start] = starts[split_segments[is_start]]
+        points[is_end] = ends[split_segments[is_end]]
+        inner = ~(is_start | is_end)
+        inner_segments = split_segments[inner]
+        points[inner] = evaluate(self.kinds[inner_segments], self.coefficients[inner_segments],
+                                 self.thetas[inner_segments], self.deltas[inner_segments],
+                                 split_ts[inner])[0]
+
+        # a piece between every two consecutive splits of the same segment
+        piece_starts = np.flatnonzero(split_segments[:-1] == split_segments[1:])
+        self.segment_ids = split_segments[piece_starts]
+        self.t0 = split_ts[piece_starts]
+        self.t1 = split_ts[piece_starts + 1]
+        self.y0 = points[piece_starts].imag
+        self.y1 = points[piece_starts + 1].imag
+        self.x0 = points[piece_starts].real
+        self.x1 = points[piece_starts + 1].real
+
+    def _y_turns(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        segment ids and t in (0, 1) where y turns, like y_extrema for every segment
+        """
+        turn_segments, turn_ts = [], []
+
+        # y'(t) = c1 + 2 c2 t + 3 c3 t^2 of all polynomials at once, lines never turn
+        polynomials = np.flatnonzero(self.kinds == POLYNOMIAL)
+        a = 3 * self.coefficients[polynomials, 3].imag
+        b = 2 * self.coefficients[polynomials, 2].imag
+        c = self.coefficients[polynomials, 1].imag
+        with np.errstate(divide="ignore", invalid="ignore"):
+            root = np.sqrt(b * b - 4 * a * c)
+            quadratic = a != 0
+            first = np.where(quadratic, (-b - root) / (2 * a), np.where(b != 0, -c / b, np.nan))
+            second = np.where(quadratic, (-b + root) / (2 * a), np.nan)
+        for ts in (first, second):
+            # nan (no root) is never inside
+            inside = (ts > 0) & (ts < 1)
+            turn_segments.append(polynomials[inside])
+            turn_ts.append(ts[inside])
+
+        # arcs are rare enough to go one by one
+        for arc in np.flatnonzero(self.kinds == ARC).tolist():
+            ts = y_extrema(ARC, self.coefficients[arc], self.thetas[arc], self.deltas[arc])
+            turn_segments.append(np.full(len(ts), arc))
+            turn_ts.append(ts)
+
+        return (np.concatenate(turn_segments).astype(np.int64),
+                np.concatenate(turn_ts).astype(float))
+
+    def sweep_arrays(self) -> Dict[str, np.ndarray]:
+        """
+        everything the sweep needs, as plain arrays that can be shared with worker processes
+        """
+        y_min = np.minimum(self.y0, self.y1)
+        y_max = np.maximum(self.y0, self.y1)
+        piece_order = np.flatnonzero(y_min != y_max)
+        piece_order = piece_order[np.argsort(y_min[piece_order], kind="stable")]
+        return {
+            "t0": self.t0, "t1": self.t1, "y0": self.y0, "y1": self.y1, "x0": self.x0, "x1": self.x1,
+            "y_min": y_min, "y_max": y_max, "piece_order": piece_order,
+            "segment_ids": self.segment_ids, "kinds": self.kinds, "coefficients": self.coefficients,
+            "thetas": self.thetas, "deltas": self.deltas,
+        }
+
+
+def iter_scanline_height_intersections(paths: List[Path],
+                                       canvas_dimensions: Tuple[float, float],
+                                       line_step=10,
+                                       angle=0,
+                                       workers=0) -> Iterator[Tuple[float, List[SegmentIntersection]]]:
+    """
+    scanline fill: the rotated segments are split into pieces that are monotone in y once,
+    the pieces are sorted by their lowest y and the heights are swept upwards while keeping a
+    table of the pieces that span the current height. lines are crossed in closed form, the
+    curve crossings are solved together in batches of heights.
+    a piece spans the heights ymin <= height < ymax, so a vertex between two segments is only
+    crossed once and horizontal lines are never crossed.
+    yields (height, intersections) in increasing height order as soon as a batch is solved,
+    the batches start small so the first hatch lines are out right away.
+    with more than one worker the heights are split into bands that are swept in worker processes
+    """
+    yield from ScanlineEdges(paths).height_intersections(canvas_dimensions, line_step, angle, workers)
+
+
+def _height_batches(heights: List[int], first_size=8, max_size=512) -> Iterator[List[int]]:
+    """
+    consecutive batches of the heights, doubling in size
+    """
+    start, size = 0, first_size
+    while start < len(heights):
+        yield heights[start:start + size]
+        start += size
+        size = min(size * 2, max_size)
+
+
+class _Sweep:
+    """
+    the table of active pieces while sweeping upwards through the heights
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        self.arrays = arrays
+        self.piece_order = arrays["piece_order"]
+        self.sorted_y_min = arrays["y_min"][self.piece_order]
+        self.active = np.empty(0, dtype=np.int64)
+        self.next_piece = 0
+
+    def crossings(self, heights: List[int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        returns the height, segment id, x and segment t of every crossing, in height order.
+        the heights have to be increasing and above the heights of the previous calls
+        """
+        arrays = self.arrays
+        y_max = arrays["y_max"]
+
+        # (height, piece) pairs of all crossings in sweep order
+        crossing_heights = [np.empty(0)]
+        crossing_pieces = [np.empty(0, dtype=np.int64)]
+        for height in heights:
+            added_until = np.searchsorted(self.sorted_y_min, height, side="right")
+            self.active = np.concatenate([self.active, self.piece_order[self.next_piece:added_until]])
+            self.next_piece = added_until
+            self.active = self.active[y_max[self.active] > height]
+            crossing_heights.append(np.full(len(self.active), height, dtype=float))
+            crossing_pieces.append(self.active)
+
+        crossing_heights = np.concatenate(crossing_heights)
+        crossing_pieces = np.concatenate(crossing_pieces)
+
+        y0, y1 = arrays["y0"][crossing_pieces], arrays["y1"][crossing_pieces]
+        t0, t1 = arrays["t0"][crossing_pieces], arrays["t1"][crossing_pieces]
+        x0, x1 = arrays["x0"][crossing_pieces], arrays["x1"][crossing_pieces]
+        f = (crossing_heights - y0) / (y1 - y0)
+        xs = x0 + f * (x1 - x0)
+        ts = t0 + f * (t1 - t0)
+
+        segment_ids = arrays["segment_ids"][crossing_pieces]
+        on_curve = arrays["kinds"][segment_ids] != _LINE
+        if on_curve.any():
+            curve_segments = segment_ids[on_curve]
+            curve_arguments = (arrays["kinds"][curve_segments],
+                               arrays["coefficients"][curve_segments],
+                               arrays["thetas"][curve_segments],
+                               arrays["deltas"][curve_segments])
+            curve_ts = solve_heights(*curve_arguments,
+                                     t0[on_curve], t1[on_curve],
+                                     y0[on_curve], y1[on_curve],
+                                     crossing_heights[on_curve])
+            ts[on_curve] = curve_ts
+            xs[on_curve] = evaluate(*curve_arguments, curve_ts)[0].real
+
+        return crossing_heights, segment_ids, xs, ts
+
+
+def _share_arrays(arrays: Dict[str, np.ndarray]) -> Tuple[SharedMemory, Dict[str, Tuple[str, tuple, int]]]:
+    """
+    copies the arrays into one shared memory block, returns the block
+    and the (dtype, shape, offset) of every array in it
+    """
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        layout[name] = (array.dtype.str, array.shape, offset)
+        # keep every array aligned
+        offset += (array.nbytes + 63) // 64 * 64
+
+    shared_memory = SharedMemory(create=True, size=max(offset, 1))
+    for name, array in arrays.items():
+        dtype, shape, array_offset = layout[name]
+        np.ndarray(shape, dtype=dtype, buffer=shared_memory.buf, offset=array_offset)[...] = array
+
+    return shared_memory, layout
+
+
+def _sweep_band(shared_memory_name: str, layout: Dict[str, Tuple[str, tuple, int]], heights: List[int]):
+    # the block belongs to the parent, it unlinks it once all bands are done
+    shared_memory = SharedMemory(name=shared_memory_name)
+    try:
+        arrays = {name: np.ndarray(shape, dtype=dtype, buffer=shared_memory.buf, offset=offset)
+                  for name, (dtype, shape, offset) in layout.items()}
+        result = tuple(np.array(a) for a in _Sweep(arrays).crossings(heights))
+        del arrays
+        return result
+    finally:
+        shared_memory.close()
+
+
+def _sweep_in_process_pool(arrays: Dict[str, np.ndarray], heights: List[int], workers: int):
+    """
+    sweeps contiguous bands of heights in worker processes and yields (band, crossings)
+    in height order as the bands finish, the pieces are shared with the workers instead
+    of being pickled for every band
+    """
+    n_bands = min(len(heights), workers * 4)
+    bands = [band.tolist() for band in np.array_split(np.array(heights), n_bands)]
+
+    shared_memory, layout = _share_arrays(arrays)
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as executor:
+            band_results = executor.map(_sweep_band, [shared_memory.name] * n_bands, [layout] * n_bands, bands)
+            for band, band_result in zip(bands, band_results):
+                yield band, band_result
+    finally:
+        shared_memory.close()
+        shared_memory.unlink()
@@ -1,16 +1,22 @@
-from typing import List, Tuple, Dict
+import logging
+from enum import Enum
+from functools import partial
+from typing import List, Tuple, Iterator
 
+import numpy as np
 from svgpathtools import Path, Line
 
-from path_quadtree import QuadTree, Point, Rect, SegmentIntersection, PathSegment
+from path_quadtree import PackedSegmentIndex, Point, Rect, SegmentIntersection, PathSegment
+from .heights import hatch_heights, path_y_ranges, covered_heights
+from .scanline import iter_scanline_height_intersections
 
 
-def get_quadtree_height_intersections(paths: List[Path],
+def iter_quadtree_height_intersections(paths: List[Path],
                                       canvas_dimensions: Tuple[float, float],
                                       line_step=10,
-                                      angle=0) -> Dict[float, List[SegmentIntersection]]:
+                                      angle=0) -> Iterator[Tuple[float, List[SegmentIntersection]]]:
     # exaggerating dimensions of quadtree in order to catch rotated paths that end up outside the canvas
-    quadtree = QuadTree(
+    quadtree = PackedSegmentIndex(
         Rect(
             Point(complex(-canvas_dimensions[0]
                   * 2, -canvas_dimensions[1] * 2)),
@@ -19,57 +25,79 @@ def get_quadtree_height_intersections(paths: List[Path],
 
     canvas_width, canvas_height = canvas_dimensions
     # line_step = int((canvas_height / n_lines) + .5)
+    paths = [path.rotated(angle, complex(canvas_width / 2, canvas_height / 2)) for path in paths]
     for path in paths:
-        quadtree.insert_path(path.rotated(
-            angle, complex(canvas_width / 2, canvas_height / 2)))
+        quadtree.insert_path(path)
 
-    heights = list(range(-int(canvas_height) * 2,
-                   int(canvas_height) * 2, line_step))
-    lines = {height: Path(Line(complex(-canvas_width, height), complex(canvas_width * 2, height))) for height in
-             heights}
-    height_intersections = {height: [] for height in heights}
+    y_mins, y_maxs = path_y_ranges(paths)
+    heights = hatch_heights(y_mins.min(initial=np.inf), y_maxs.max(initial=-np.inf), canvas_height, line_step)
 
-    # get all intersections
-    for height, line in lines.items():
-        intersections = quadtree.get_intersections(line)
-        for intersection in intersections:
-            height_intersections[height].append(intersection)
+    # heights in gaps between the paths stay empty without a query
+    is_covered = covered_heights(heights, y_mins, y_maxs).tolist()
+    for height, covered in zip(heights, is_covered):
+        if not covered:
+            yield height, []
+            continue
 
-    return height_intersections
+        line = Path(Line(complex(-canvas_width, height), complex(canvas_width * 2, height)))
+        yield height, list(quadtree.get_intersections(line))
 
+    logging.debug("hatch intersection index: %s", quadtree.stats)
 
-def get_brute_force_height_intersections(paths: List[Path],
-                                         canvas_dimensions: Tuple[int, int],
-                                         line_step=10,
-                                         angle=0) -> Dict[float, List[SegmentIntersection]]:
+
+def iter_brute_force_height_intersections(paths: List[Path],
+                                          canvas_dimensions: Tuple[int, int],
+                                          line_step=10,
+                                          angle=0) -> Iterator[Tuple[float, List[SegmentIntersection]]]:
     canvas_width, canvas_height = canvas_dimensions
     # line_step = int((canvas_height / n_lines) + .5)
     paths = [path.rotated(angle, complex(
         canvas_width / 2, canvas_height / 2)) for path in paths]
 
-    heights = list(range(-int(canvas_height) * 2,
-                   int(canvas_height) * 2, line_step))
-    lines = {height: Path(Line(complex(-canvas_width, height), complex(canvas_width * 2, height))) for height in
-             heights}
-    height_intersections = {height: [] for height in heights}
+    y_mins, y_maxs = path_y_ranges(paths)
+    heights = hatch_heights(y_mins.min(initial=np.inf), y_maxs.max(initial=-np.inf), canvas_height, line_step)
 
-    # get all intersections
-    for height, line in lines.items():
-        for path in paths:
+    # only intersect the paths whose bbox spans the height
+    paths = [path for path in paths if len(path) > 0]
+    for height in heights:
+        height_intersections = []
+        line = Path(Line(complex(-canvas_width, height), complex(canvas_width * 2, height)))
+        for path_idx in np.flatnonzero((y_mins <= height) & (y_maxs >= height)).tolist():
+            path = paths[path_idx]
             try:
                 path_intersections = path.intersect(line, tol=1e-12)
                 for (T1, seg1, t1), (_T2, _seg2, _t2) in path_intersections:
                     intersection_point = path.point(T1)
-                    height_intersections[height].append(SegmentIntersection(intersection_point,
-                                                                            point_in_path=t1,
-                                                                            point_in_original_path=T1,
-                                                                            segment=PathSegment(
-                                                                                segment=seg1,
-                                                                                original_path=path
-                                                                            )))
+                    height_intersections.append(SegmentIntersection(intersection_point,
+                                                                    point_in_path=t1,
+                                                                    point_in_original_path=T1,
+                                                                    segment=PathSegment(
+                                                                        segment=seg1,
+                                                                        original_path=path
+                                                                    )))
             except Exception as e:
                 print("An error occurred trying to get an intersection:", e)
                 print("Path D:", path.d())
                 print("Collision Path D:", line.d())
 
-    return height_intersections
+        yield height, height_intersections
+
+
+class IntersectionEngine(Enum):
+    QUADTREE = "quadtree"
+    BRUTE_FORCE = "brute_force"
+    SCANLINE = "scanline"
+
+
+def get_height_intersections_func(intersection_engine: IntersectionEngine, workers=0):
+    """
+    the engines yield (height, intersections) in increasing height order, as they are found.
+    workers > 1 sweeps the scanline in a process pool, the other engines always run in this process
+    """
+    height_intersection_funcs = {
+        IntersectionEngine.QUADTREE: iter_quadtree_height_intersections,
+        IntersectionEngine.BRUTE_FORCE: iter_brute_force_height_intersections,
+        IntersectionEngine.SCANLINE: partial(iter_scanline_height_intersections, workers=workers),
+    }
+
+    return height_intersection_funcs[intersection_engine]
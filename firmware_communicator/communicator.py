@@ -8,11 +8,24 @@ from threading import Thread, Event
 CMD_PROCESSED_SUCCESSFULLY_MSG = "OK"
 CMD_PROCESSING_FAILURE_MSG = "FAIL"
 SETUP_DONE_MSG = "SETUP DONE"
-STATUS_START_MSG = "STATUS START"
+STATUS_FRAME_MSG = "STATUS FRAME"
 UNRECOGNIZED_CMD_MSG = "DID NOT RECOGNIZE COMMAND TYPE"
 CHECKSUM_MISMATCH = "CHECKSUM MISMATCH"
 CMD_PROCESSED_EVENT = Event()
 
+# every command starts with a sequence number, the firmware only processes the one it expects
+# next and answers with "OK <seq> <free position slots>" or "FAIL <seq> <free position slots>".
+# the number only moves on after an OK, so a failed command can be entered again
+next_seq = 0
+last_reply_ok = False
+
+# binary status frame that follows a STATUS FRAME line, see printStatus in the firmware:
+# version, payload length, payload, checksum (sum of the bytes before it, 16 bits)
+STATUS_FRAME_VERSION = 1
+STATUS_FRAME_HEADER = struct.Struct("<BB")
+STATUS_FRAME_CHECKSUM = struct.Struct("<H")
+STATUS_PAYLOAD = struct.Struct("<BBiiiiiiifiiiqiii")
+
 
 class Mode(Enum):
     IDLE = 0
@@ -27,6 +40,10 @@ class Command(Enum):
     SET_MODE = 2
     CALIBRATE = 3
     ADD_POSITION = 4
+    SET_ANGLE_CORRECTION = 5
+    ADD_POSITIONS = 6
+    RESET_SEQUENCE = 7
+    PING = 8
 
 
 class Status:
@@ -52,34 +69,34 @@ class Status:
         self.maxAmplitudeButtonPressed = 0
         self.minAngleButtonPressed = 0
         self.maxAngleButtonPressed = 0
+        self.angleCorrectionEnabled = False
 
     def update_status(self, serial_conn: serial.Serial):
-        self.currentMode = Mode(int(serial_conn.readline()))
-        self.calibrated = False if int(serial_conn.readline()) == 0 else True
-        self.calibrating = False if int(serial_conn.readline()) == 0 else True
-
-        self.amplitudeStepperPos = int(serial_conn.readline())
-        self.amplitudeStepperTargetPos = int(serial_conn.readline())
-        self.amplitudeStepperSpeed = int(serial_conn.readline())
-
-        self.angleStepperPos = int(serial_conn.readline())
-        self.angleStepperTargetPos = int(serial_conn.readline())
-        self.angleStepperSpeed = int(serial_conn.readline())
-
-        self.travelableDistanceSteps = int(serial_conn.readline())
-        self.stepsPerMm = float(serial_conn.readline())
-        self.minAmplitudePos = int(serial_conn.readline())
-        self.maxAmplituePos = int(serial_conn.readline())
-        self.maxAnglePos = int(serial_conn.readline())
-        self.encoderCount = int(serial_conn.readline())
-        self.maxEncoderCount = int(serial_conn.readline())
-        self.nextPosToPlaceIdx = int(serial_conn.readline())
-        self.nextPosToGoIdx = int(serial_conn.readline())
-
-        self.minAmplitudeButtonPressed = int(serial_conn.readline())
-        self.maxAmplitudeButtonPressed = int(serial_conn.readline())
-        self.minAngleButtonPressed = int(serial_conn.readline())
-        self.maxAngleButtonPressed = int(serial_conn.readline())
+        header = serial_conn.read(STATUS_FRAME_HEADER.size)
+        version, length = STATUS_FRAME_HEADER.unpack(header)
+        payload = serial_conn.read(length)
+        checksum, = STATUS_FRAME_CHECKSUM.unpack(serial_conn.read(STATUS_FRAME_CHECKSUM.size))
+        if checksum != sum(header + payload) & 0xffff:
+            raise ValueError("status frame checksum mismatch")
+        if version != STATUS_FRAME_VERSION or length != STATUS_PAYLOAD.size:
+            raise ValueError("status frame version %d with %d bytes is not supported" % (version, length))
+
+        (mode, flags,
+         self.amplitudeStepperPos, self.amplitudeStepperTargetPos, self.amplitudeStepperSpeed,
+         self.angleStepperPos, self.angleStepperTargetPos, self.angleStepperSpeed,
+         self.travelableDistanceSteps, self.stepsPerMm,
+         self.minAmplitudePos, self.maxAmplituePos, self.maxAnglePos,
+         self.encoderCount, self.maxEncoderCount,
+         self.nextPosToPlaceIdx, self.nextPosToGoIdx) = STATUS_PAYLOAD.unpack(payload)
+
+        self.currentMode = Mode(mode)
+        self.calibrated = bool(flags & 1 << 0)
+        self.calibrating = bool(flags & 1 << 1)
+        self.angleCorrectionEnabled = bool(flags & 1 << 2)
+        self.minAmplitudeButtonPressed = int(bool(flags & 1 << 3))
+        self.maxAmplitudeButtonPressed = int(bool(flags & 1 << 4))
+        self.minAngleButtonPressed = int(bool(flags & 1 << 5))
+        self.maxAngleButtonPressed = int(bool(flags & 1 << 6))
 
     def __str__(self) -> str:
         out_str = ""
@@ -105,6 +122,7 @@ class Status:
         out_str += "Max Amplitude Pressed: %s\n" % self.maxAmplitudeButtonPressed
         out_str += "Min Angle Pressed: %s\n" % self.minAngleButtonPressed
         out_str += "Max Angle Pressed: %s\n" % self.maxAngleButtonPressed
+        out_str += "Angle Correction Enabled: %s\n" % self.angleCorrectionEnabled
 
         return out_str
 
@@ -136,6 +154,7 @@ def get_calib_msg():
 
 
 def read_from_serial(connection: serial.Serial):
+    global last_reply_ok
     received = b''
     while True:
         try:
@@ -152,11 +171,15 @@ def read_from_serial(connection: serial.Serial):
             except Exception as e:
                 pass
 
-            if line == CMD_PROCESSED_SUCCESSFULLY_MSG:
+            reply = line.split(" ")[0] if isinstance(line, str) else line
+            if reply == CMD_PROCESSED_SUCCESSFULLY_MSG:
+                last_reply_ok = True
                 CMD_PROCESSED_EVENT.set()
-            elif line == CMD_PROCESSING_FAILURE_MSG:
+            elif reply == CMD_PROCESSING_FAILURE_MSG:
+                print("serial:", line)
+                last_reply_ok = False
                 CMD_PROCESSED_EVENT.set()
-            elif line == STATUS_START_MSG:
+            elif line == STATUS_FRAME_MSG:
                 status = Status()
                 status.update_status(connection)
                 print(status)
@@ -183,7 +206,19 @@ def encode_float(val: float):
 
 
 def write_command(serial: serial.Serial, cmd: bytes):
-    serial.write(b'<<<' + cmd + b'>>>')
+    serial.write(b'<<<' + encode_int(next_seq) + cmd + b'>>>')
+
+
+def send_command(serial: serial.Serial, cmd: bytes):
+    global next_seq
+    CMD_PROCESSED_EVENT.clear()
+    write_command(serial, cmd)
+    while not CMD_PROCESSED_EVENT.wait(timeout=1):
+        print("waiting for command completion")
+        pass
+
+    if last_reply_ok:
+        next_seq += 1
 
 
 def find_serial_port():
@@ -207,6 +242,9 @@ def main():
         read_thread = Thread(target=read_from_serial, args=(serial_conn,))
         read_thread.start()
 
+        # the firmware might still expect the sequence numbers of a previous connection
+        send_command(serial_conn, encode_int(Command.RESET_SEQUENCE.value))
+
         while True:
             try:
                 command = Command(int(input()))
@@ -215,6 +253,8 @@ def main():
                 if command == Command.SET_MODE:
                     mode = Mode(int(input()))
                     msg += encode_int(mode.value)
+                elif command == Command.SET_ANGLE_CORRECTION:
+                    msg += encode_int(int(input()))
                 elif command == Command.CALIBRATE:
                     msg += get_calib_msg()
                 elif command == Command.ADD_POSITION:
@@ -249,12 +289,7 @@ def main():
                     # print(status)
                     pass
 
-                write_command(serial_conn, msg)
-                while not CMD_PROCESSED_EVENT.wait(timeout=1):
-                    print("waiting for command completion")
-                    pass
-
-                CMD_PROCESSED_EVENT.clear()
+                send_command(serial_conn, msg)
             except Exception as e:
                 print("failed parsing user input:", e)
     except (KeyboardInterrupt, Exception) as e:
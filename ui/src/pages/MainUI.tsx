@@ -73,6 +73,7 @@ function MainUI() {
     const [toolpathAlgorithm, setToolpathAlgorithm] = useState("none");
     const [lineStep, setLineStep] = useState(10);
     const [toolpathAngle, setToolpathAngle] = useState(0);
+    const [toolpathPasses, setToolpathPasses] = useState(2);
 
     // toolpath algorithm config
     const [pathSortingAlgorithm, setPathSortingAlgorithm] = useState("none");
@@ -246,6 +247,7 @@ function MainUI() {
                 algorithm: toolpathAlgorithm,
                 line_step: lineStep,
                 angle: toolpathAngle,
+                passes: toolpathPasses,
             },
             pathsort_config: {
                 algorithm: pathSortingAlgorithm,
@@ -549,6 +551,7 @@ function MainUI() {
                                         "lines": "Lines",
                                         "zigzag": "ZigZag",
                                         "rectlines": "RectLines",
+                                        "crosshatch": "CrossHatch",
                                     }}
                                     onValueChange={(val) => { setToolpathAlgorithm(val) }}
                                 ></Dropdown>
@@ -559,6 +562,19 @@ function MainUI() {
                             <div className="ml-5 flex">
                                 <RangeInput title="angle" max={360} onValueChange={(val) => { setToolpathAngle(parseInt(val)) }}></RangeInput>
                             </div>
+                            {toolpathAlgorithm === "crosshatch" ?
+                                <>
+                                    <div className="ml-5 flex">
+                                        <NumberInput
+                                            title="passes"
+                                            default={toolpathPasses}
+                                            min={1}
+                                            max={6}
+                                            onValueChange={(val) => { setToolpathPasses(parseInt(val)) }}
+                                        ></NumberInput>
+                                    </div>
+                                </>
+                                : null}
                         </div>
                     </div>
 
@@ -575,6 +591,9 @@ function MainUI() {
                                         "closest_path_with_reverse": "Simple Variant1",
                                         "closest_path_with_start_anywhere": "Simple Variant2",
                                         "radar_scan": "Radar Scan",
+                                        "closest_path_indexed": "Simple (Indexed)",
+                                        "closest_path_with_reverse_indexed": "Simple Variant1 (Indexed)",
+                                        "closest_path_move_time": "Shortest Move Time",
                                     }}
                                     onValueChange={(val) => { setPathSortingAlgorithm(val) }}
                                 ></Dropdown>